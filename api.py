@@ -0,0 +1,208 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+from datetime import datetime
+from flask import Blueprint, current_app, request, stream_with_context, abort
+from models import db, Venue, Artist, Show
+from queries import (
+    get_page_args, keyset_page, decode_cursor,
+    venue_details, artist_details)
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Rows streamed per round trip from the server-side cursor in NDJSON mode
+STREAM_BATCH_SIZE = 1000
+
+#----------------------------------------------------------------------------#
+# Resources.
+#----------------------------------------------------------------------------#
+
+VENUE_FIELDS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'city': Venue.city,
+    'state': Venue.state,
+    'address': Venue.address,
+    'phone': Venue.phone,
+    'website': Venue.website,
+    'image_link': Venue.image_link,
+    'facebook_link': Venue.facebook_link,
+    'genres': Venue.genres,
+    'seeking_talent': Venue.seeking_talent,
+    'seeking_description': Venue.seeking_description,
+    'updated_at': Venue.updated_at,
+}
+
+ARTIST_FIELDS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'website': Artist.website,
+    'image_link': Artist.image_link,
+    'facebook_link': Artist.facebook_link,
+    'genres': Artist.genres,
+    'seeking_venue': Artist.seeking_venue,
+    'seeking_description': Artist.seeking_description,
+    'updated_at': Artist.updated_at,
+}
+
+SHOW_FIELDS = {
+    'id': Show.id,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+    'start_time': Show.start_time,
+}
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+
+def to_json(value):
+    return json.dumps(value, default=lambda o: o.isoformat() if isinstance(o, datetime) else str(o))
+
+
+def json_response(value, status=200):
+    return current_app.response_class(to_json(value), status=status, mimetype='application/json')
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return json_response({'error': error.description}, status=error.code)
+
+
+def get_fields(available):
+    """
+    Returns the fields requested with ?fields=a,b, or all available fields.
+    Aborts with 400 on unknown field names.
+    """
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def select_fields(available, fields, keys):
+    """
+    Returns a query selecting the requested fields, in order, followed by any key
+    columns that were not requested, which are needed to build cursors.
+    """
+    columns = []
+    for field in fields:
+        column = available[field]
+        columns.append(column if column.key == field else column.label(field))
+    columns += [key for key in keys
+        if not any(available[field] is key for field in fields)]
+    return db.session.query(*columns)
+
+
+def serialize(row, fields):
+    return {field: row[i] for i, field in enumerate(fields)}
+
+
+def stream_ndjson(query, keys, fields):
+    """
+    Streams every row of the query after the optional ?after cursor as NDJSON.
+    Rows are read from a server-side cursor in batches, so the whole result is
+    never held in memory.
+    """
+    after = decode_cursor(request.args.get('after'), keys)
+    if after is not None:
+        query = query.filter(db.tuple_(*keys) > after)
+    query = query.order_by(*keys).execution_options(stream_results=True
+        ).yield_per(STREAM_BATCH_SIZE)
+
+    def generate():
+        for row in query:
+            yield to_json(serialize(row, fields)) + '\n'
+
+    return current_app.response_class(stream_with_context(generate()),
+        mimetype='application/x-ndjson')
+
+
+def listing(query, keys, fields):
+    """
+    Returns one keyset page of the query as JSON, or the whole listing as NDJSON
+    when ?format=ndjson is given.
+    """
+    if request.args.get('format') == 'ndjson':
+        return stream_ndjson(query, keys, fields)
+
+    page = keyset_page(query, keys, **get_page_args())
+    return json_response({
+        'data': [serialize(row, fields) for row in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+def detail(data, fields):
+    if data is None:
+        abort(404, description='Not found')
+    if request.args.get('fields'):
+        data = {field: data[field] for field in fields}
+    return json_response(data)
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+
+@api.route('/venues')
+def venues():
+    fields = get_fields(VENUE_FIELDS)
+    keys = [Venue.id]
+    return listing(select_fields(VENUE_FIELDS, fields, keys), keys, fields)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    data = venue_details(venue_id)
+    return detail(data, get_fields(data or VENUE_FIELDS))
+
+
+@api.route('/artists')
+def artists():
+    fields = get_fields(ARTIST_FIELDS)
+    keys = [Artist.id]
+    return listing(select_fields(ARTIST_FIELDS, fields, keys), keys, fields)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    data = artist_details(artist_id)
+    return detail(data, get_fields(data or ARTIST_FIELDS))
+
+
+@api.route('/shows')
+def shows():
+    fields = get_fields(SHOW_FIELDS)
+    keys = [Show.start_time, Show.id]
+    query = select_fields(SHOW_FIELDS, fields, keys
+        ).select_from(Show
+        ).join(Venue, Show.venue_id == Venue.id
+        ).join(Artist, Show.artist_id == Artist.id)
+    return listing(query, keys, fields)
+
+
+@api.route('/shows/<int:show_id>')
+def show(show_id):
+    fields = get_fields(SHOW_FIELDS)
+    row = select_fields(SHOW_FIELDS, fields, []
+        ).select_from(Show
+        ).join(Venue, Show.venue_id == Venue.id
+        ).join(Artist, Show.artist_id == Artist.id
+        ).filter(Show.id == show_id).first()
+    return detail(row and serialize(row, fields), fields)
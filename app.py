@@ -3,20 +3,37 @@
 #----------------------------------------------------------------------------#
 
 from email import message
+import hashlib
 import dateutil.parser
 from datetime import datetime
 import babel
+import babel.dates
+from functools import lru_cache
 from flask import (
       Flask, render_template, 
       request, flash, redirect,
-      url_for)
+      url_for, abort, session,
+      make_response, stream_with_context,
+      get_flashed_messages, has_request_context)
+from sqlalchemy import event
+from werkzeug.http import is_resource_modified
 from flask_moment import Moment
-import logging
-from logging import Formatter, FileHandler
 from flask_migrate import Migrate
 from flask_wtf import CSRFProtect
+from flask_wtf.csrf import generate_csrf
 from forms import *
 from models import *
+from queries import *
+from commands import *
+from cache import Cache
+from profiling import QueryProfiler
+from metrics import Metrics
+from logconfig import QueuedLogging
+from sessions import RotatingKeySessionInterface
+from assets import Assets
+from compression import Compression
+from api import api
+from exporter import EXPORTS, FORMATS, export_chunks
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -25,6 +42,7 @@ from models import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
+app.session_interface = RotatingKeySessionInterface()
 db.app = app
 db.init_app(app)
 Migrate(app, db)
@@ -32,18 +50,68 @@ Migrate(app, db)
 csrf = CSRFProtect(app)
 csrf.init_app(app)
 
+cache = Cache(app)
+profiler = QueryProfiler(app)
+metrics = Metrics(app)
+assets = Assets(app)
+Compression(app)
+
+app.register_blueprint(api)
+
+app.cli.add_command(check_indexes_command)
+app.cli.add_command(check_pool_command)
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(seed_command)
+app.cli.add_command(assets_command)
+app.cli.add_command(roll_show_counts_command)
+
+
+@event.listens_for(db.session, 'after_begin')
+def limit_statement_time(session, transaction, connection):
+    # Statements run for a web request are cut off after DB_STATEMENT_TIMEOUT
+    # ms. Migrations and flask commands run outside requests, without a limit
+    timeout = app.config['DB_STATEMENT_TIMEOUT']
+    if timeout and has_request_context() and connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {timeout:d}')
+
 
 #----------------------------------------------------------------------------#
 # Utility Functions.
 #----------------------------------------------------------------------------#
 
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+DATETIME_LOCALE = babel.Locale.parse('en')
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format):
+    """
+    Returns the compiled Babel pattern for a format name or custom pattern, or
+    None for Babel's own named formats.
+    """
+    format = DATETIME_FORMATS.get(format, format)
+    if format in ('long', 'short'):
+        return None
+    return babel.dates.parse_pattern(format)
+
+@lru_cache(maxsize=4096)
+def cached_format_datetime(date, format):
+    pattern = datetime_pattern(format)
+    if pattern is None:
+        return babel.dates.format_datetime(date, format, locale=DATETIME_LOCALE)
+    return pattern.apply(date, DATETIME_LOCALE)
+
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format="EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format="EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    """
+    Formats a datetime for display. Results are memoized per (datetime, format),
+    so shows sharing a start time are only formatted once.
+    """
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return cached_format_datetime(value, format)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -54,6 +122,99 @@ def get_bool(field_name):
         seeking = False
     return seeking
 
+def page_cache_key(page_args, etag=''):
+    return '{etag}:{after}:{before}:{limit}'.format(etag=etag, **page_args)
+
+def conditional_response(validator, render):
+    """
+    Returns the page with its Last-Modified and ETag headers, answering
+    conditional requests for an unchanged page with 304 Not Modified without
+    rendering it. Pages with pending flash messages are always rendered.
+
+    render is called with the ETag of the page's data, which belongs in the
+    keys of the cached data it renders: any change to the validator is then a
+    cache miss in every worker, so one ETag never names two different bodies.
+
+    The layout's forms embed the session's CSRF token, so the ETag sent to the
+    browser also covers the token and the key signing it. A browser with a new
+    session, or after a key rotation, gets the page again rather than a 304 for
+    a copy whose forms would be rejected. Only the ETag decides, as
+    If-Modified-Since cannot tell sessions apart.
+    """
+    last_modified, etag = validator
+    generate_csrf()
+    token = session[app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')]
+    session_etag = hashlib.sha1(
+        f'{etag}:{token}:{app.secret_key}'.encode()).hexdigest()
+    if '_flashes' not in session and not is_resource_modified(
+            request.environ, etag=session_etag):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render(etag))
+
+    response.set_etag(session_etag)
+    response.last_modified = last_modified
+    # Pages carry per-session CSRF tokens, so only the browser may store them
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# Template output events sent per chunk of a streamed page
+STREAM_BUFFER_SIZE = 100
+
+def stream_template(template_name, **context):
+    """
+    Renders a template as a stream of chunks, so that the start of the page is
+    sent while the rest is still being rendered. The session is saved before
+    the body is sent, so the CSRF token and flashed messages the layout reads
+    are loaded up front.
+    """
+    generate_csrf()
+    get_flashed_messages()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    return stream_with_context(stream)
+
+def touch(model, ids):
+    """
+    Marks venues or artists as updated, for writes that change their pages
+    without editing the rows themselves.
+    """
+    model.query.filter(model.id.in_(ids)).update(
+        {'updated_at': datetime.utcnow()}, synchronize_session=False)
+
+def record_deletion(*models):
+    """
+    Records that rows were deleted from the tables of the given models, which
+    changes the validators of their listings.
+    """
+    now = datetime.utcnow()
+    for model in models:
+        table = model.__tablename__
+        if not Deletion.query.filter_by(table=table).update({'deleted_at': now}):
+            db.session.add(Deletion(table=table, deleted_at=now))
+
+def venue_namespaces(venue_id):
+    """
+    Returns the cache namespaces holding data about a venue: the venue and show
+    listings, the venue's page and the pages of artists playing there.
+    """
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).distinct()
+    return ['venues', 'shows', f'venue:{venue_id}'] + [
+        f'artist:{artist_id}' for artist_id, in artist_ids]
+
+def artist_namespaces(artist_id):
+    """
+    Returns the cache namespaces holding data about an artist. The venue listing
+    is included since it counts the artist's upcoming shows.
+    """
+    venue_ids = db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).distinct()
+    return ['artists', 'shows', 'venues', f'artist:{artist_id}'] + [
+        f'venue:{venue_id}' for venue_id, in venue_ids]
+
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -72,44 +233,18 @@ def index():
 @app.route('/venues')
 def venues():
     """
-    Returns a list of all venues. Filters the list by location, with each location
+    Returns a page of venues. Filters the page by location, with each location
     containing a list of venues (name, id, and number of upcoming shows).
     """
-    # First query the venues table for all venues
-    all_venues = Venue.query.all()
-
-    # Create and populate dictionary for storing and sorting venues by city and state
-    venues_dict = {}
-    for venue in all_venues:
-        # Set the city and state as keys
-        key = f"{venue.city}, {venue.state}"
-
-        upcoming_shows = []
-        past_shows = []
-        for show in venue.shows:
-            if show.start_time > datetime.now():
-                upcoming_shows.append(show)
-            else:
-                past_shows.append(show)
-
-        venues_dict.setdefault(key, []).append({
-          'id': venue.id,
-          'name': venue.name,
-          'city': venue.city,
-          'state': venue.state,
-          'num_upcoming_shows': len(upcoming_shows),
-        })
-    # Create a list with dictionaries for all locations and append the Venue values
-    # for that location to the list.
-    data = []
-    for val in venues_dict.values():
-        data.append({
-          'city': val[0]['city'],
-          'state': val[0]['state'],
-          'venues': val
-        })
-
-    return render_template('pages/venues.html', areas=data)
+    page_args = get_page_args()
+
+    def render(etag):
+        page = cache.fetch('venues', page_cache_key(page_args, etag),
+            lambda: venue_areas(**page_args))
+        return app.response_class(
+            stream_template('pages/venues.html', areas=page.items, page=page))
+
+    return conditional_response(listing_validator(Venue, Show.venue_id), render)
 
 
 @app.route('/venues/search', methods=['POST'])
@@ -117,73 +252,29 @@ def search_venues():
     """
     Returns a list of venues matching the query term. Search results are 
     case-insensitive. They also do not have to be an exact match, only a phrasal
-    match.
+    or similarly spelled match, and are ranked by similarity.
     """
     search_term = request.form.get('search_term', '')
-    matched_venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%'))
-
-    data = []
-    for match in matched_venues:
-        data.append({
-            "id": match.id,
-            "name": match.name,
-            "num_upcoming_shows": len(match.shows)
-        })
-    response = {
-        "count": len(data),
-        "data": data
-        }
+    response = search_results(Venue, search_term,
+        limit=app.config['SEARCH_LIMIT'])
 
     return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
+    validator = page_validator(Venue, Show.venue_id, venue_id)
+    if validator is None:
+        abort(404)
+
+    def render(etag):
+        venue_data = cache.fetch(f'venue:{venue_id}', f'{etag}:details',
+            lambda: venue_details(venue_id))
+        if venue_data is None:
+            abort(404)
+        return render_template('pages/show_venue.html', venue=venue_data)
 
-    # Populate list of upcoming shows
-    upcoming_shows_query = db.session.query(Show).join(Artist).filter(
-                Show.venue_id==venue_id).filter(Show.start_time>datetime.now()).all()
-    upcoming_shows = []
-    for show in upcoming_shows_query:
-        upcoming_shows.append({
-          "artist_id": show.artist.id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-          })
-    # Populate list of past shows
-    past_shows_query = db.session.query(Show).join(Artist).filter(
-                  Show.venue_id==venue_id).filter(Show.start_time < datetime.now()).all()
-    past_shows = []
-    for show in past_shows_query:
-        past_shows.append({
-          "artist_id": show.artist.id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-          })
-
-    venue_data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres,
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
-
-    return render_template('pages/show_venue.html', venue=venue_data)
+    return conditional_response(validator, render)
 
 
 @app.route('/venues/create', methods=['GET'])
@@ -215,6 +306,7 @@ def create_venue_submission():
           genres=genres, seeking_talent=seeking_talent, seeking_description=seeking_description)
         db.session.add(new_venue)
         db.session.commit()
+        cache.invalidate('venues')
 
         new_venue = Venue.query.filter_by(name=name).all()[0]
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
@@ -232,8 +324,17 @@ def delete_venue(venue_id):
     Delete an existing venue and redirect the user to the home page
     """
     try:
+        # Collect the affected namespaces before the venue's shows are deleted
+        namespaces = venue_namespaces(venue_id)
+        artist_ids = [id for id, in db.session.query(Show.artist_id).filter(
+            Show.venue_id == venue_id).distinct()]
+        touch(Artist, artist_ids)
         Venue.query.filter_by(id=venue_id).delete()
+        # The venue's shows are deleted with it
+        record_deletion(Venue, Show)
+        recount_upcoming_shows(Artist, Show.artist_id, artist_ids)
         db.session.commit()
+        cache.invalidate(*namespaces)
     except:
         db.session.rollback()
     finally:
@@ -246,43 +347,29 @@ def delete_venue(venue_id):
 @app.route('/artists')
 def artists():
     """
-    Returns a list of dictionaries with artist's name and id
+    Returns a page of dictionaries with artist's name and id
     """
-    data = []
-    all_artists = Artist.query.all()
+    page_args = get_page_args()
 
-    for artist in all_artists:
-        artist_details = {
-            "id": artist.id,
-            "name": artist.name
-            }
-        data.append(artist_details)
+    def render(etag):
+        page = cache.fetch('artists', page_cache_key(page_args, etag),
+            lambda: artist_listings(**page_args))
+        return app.response_class(
+            stream_template('pages/artists.html', artists=page.items, page=page))
 
-    return render_template('pages/artists.html', artists=data)
+    return conditional_response(listing_validator(Artist), render)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
     """
     Returns a list of artists that match the search query.
-    Searches are case insensitive, and matches don't have to be exact.
+    Searches are case insensitive, and matches don't have to be exact; similarly
+    spelled names also match, best matches first.
     """
     search_term = request.form.get('search_term', '')
-    data = []
-    matched_artists = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-
-    for artist in matched_artists:
-        artist_details = {
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": len(artist.shows)
-            }
-        data.append(artist_details)
-
-    response = {
-        "count": len(matched_artists),
-        "data": data
-        }
+    response = search_results(Artist, search_term,
+        limit=app.config['SEARCH_LIMIT'])
 
     return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
@@ -292,50 +379,18 @@ def show_artist(artist_id):
     """
     Returns artist details alongside details of the shows they've registered for
     """
-    artist = Artist.query.get(artist_id)
-    
-    upcoming_shows_query = db.session.query(Show).join(Artist).filter(
-                Show.artist_id==artist_id).filter(Show.start_time>datetime.now()).all()
-    upcoming_shows = []
-    for show in upcoming_shows_query:
-        upcoming_shows.append({
-          "artist_id": show.venue.id,
-          "artist_name": show.venue.name,
-          "artist_image_link": show.venue.image_link,
-          "start_time": show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-          })
-
-    past_shows_query = db.session.query(Show).join(Venue).filter(
-                  Show.artist_id==artist_id).filter(Show.start_time < datetime.now()).all()
-    past_shows = []
-    for show in past_shows_query:
-        past_shows.append({
-          "artist_id": show.venue.id,
-          "artist_name": show.venue.name,
-          "artist_image_link": show.venue.image_link,
-          "start_time": show.start_time.strftime('%m/%d/%Y, %H:%M:%S')
-          })
-
-    # Curate the data response to be returned
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres,
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_description,
-        "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows)
-        }
-
-    return render_template('pages/show_artist.html', artist=data)
+    validator = page_validator(Artist, Show.artist_id, artist_id)
+    if validator is None:
+        abort(404)
+
+    def render(etag):
+        data = cache.fetch(f'artist:{artist_id}', f'{etag}:details',
+            lambda: artist_details(artist_id))
+        if data is None:
+            abort(404)
+        return render_template('pages/show_artist.html', artist=data)
+
+    return conditional_response(validator, render)
 
 
 @app.route('/artists/create', methods=['GET'])
@@ -365,6 +420,7 @@ def create_artist_submission():
             facebook_link=facebook_link, image_link=image_link, website=website)
         db.session.add(artist)
         db.session.commit()
+        cache.invalidate('artists')
         artist = Artist.query.filter_by(name=name).all()[0]
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
         return redirect(url_for('show_artist', artist_id=artist.id))
@@ -381,8 +437,16 @@ def delete_artist(artist_id):
     Delete an existing venue and redirect the user to the home page
     """
     try:
+        # Collect the affected namespaces before the artist's shows are deleted
+        namespaces = artist_namespaces(artist_id)
+        venue_ids = [id for id, in db.session.query(Show.venue_id).filter(
+            Show.artist_id == artist_id).distinct()]
+        touch(Venue, venue_ids)
         Artist.query.filter_by(id=artist_id).delete()
+        record_deletion(Artist, Show)
+        recount_upcoming_shows(Venue, Show.venue_id, venue_ids)
         db.session.commit()
+        cache.invalidate(*namespaces)
     except:
         db.session.rollback()
     finally:
@@ -430,7 +494,11 @@ def edit_artist_submission(artist_id):
         artist.website = request.form['website_link']
 
         db.session.add(artist)
+        # The pages of the venues the artist plays at show the artist's name and
+        # image, so they change too
+        touch(Venue, db.session.query(Show.venue_id).filter(Show.artist_id == artist_id))
         db.session.commit()
+        cache.invalidate(*artist_namespaces(artist_id))
         flash("Artist " + artist.name + "was successfully updated!")
     else:
         flash('An error occurred.')
@@ -479,7 +547,10 @@ def edit_venue_submission(venue_id):
         venue.image_link = request.form['image_link']
 
         db.session.add(venue)
+        # The pages of the artists playing at the venue show its name and image
+        touch(Artist, db.session.query(Show.artist_id).filter(Show.venue_id == venue_id))
         db.session.commit()
+        cache.invalidate(*venue_namespaces(venue_id))
         flash("Venue " + venue.name + "was successfully updated!")
     else:
         flash('An error occurred.')
@@ -492,21 +563,15 @@ def edit_venue_submission(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/shows')
 def shows():
-    all_shows = Show.query.all()
-    data = []
-    
-    for show in all_shows:
-        show_details = {
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time.strftime("%m/%d/%Y %H:%M:%S")
-            }
-        data.append(show_details) 
-    
-    return render_template('pages/shows.html', shows=data)
+    page_args = get_page_args()
+
+    def render(etag):
+        page = cache.fetch('shows', page_cache_key(page_args, etag),
+            lambda: show_listings(**page_args))
+        return app.response_class(
+            stream_template('pages/shows.html', shows=page.items, page=page))
+
+    return conditional_response(show_listing_validator(), render)
 
 
 @app.route('/shows/create')
@@ -526,7 +591,14 @@ def create_show_submission():
         new_show = Show(artist_id=artist_id,
             venue_id=venue_id, start_time=start_time)
         db.session.add(new_show)
+        db.session.flush()
+        touch(Venue, [venue_id])
+        touch(Artist, [artist_id])
+        recount_upcoming_shows(Venue, Show.venue_id, [venue_id])
+        recount_upcoming_shows(Artist, Show.artist_id, [artist_id])
         db.session.commit()
+        cache.invalidate('shows', 'venues',
+            f'venue:{venue_id}', f'artist:{artist_id}')
         flash('Show was successfully listed!')
     else:
         flash('An error occurred. Show could not be listed.')
@@ -535,6 +607,22 @@ def create_show_submission():
     return redirect(url_for('shows'))
 
 
+#  Export
+#  ----------------------------------------------------------------
+@app.route('/export/<table>.<format>')
+def export(table, format):
+    """
+    Streams a whole table as a CSV or NDJSON download, read from a server-side
+    cursor and sent in chunks.
+    """
+    if table not in EXPORTS or format not in FORMATS:
+        abort(404)
+    return app.response_class(
+        stream_with_context(export_chunks(table, format)),
+        mimetype=FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename={table}.{format}'})
+
+
 #  Error Handling
 #  ----------------------------------------------------------------
 @app.errorhandler(404)
@@ -547,14 +635,9 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    QueuedLogging(app)
     app.logger.info('errors')
+    app.logger.info(pool_layout(app.config))
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -0,0 +1,202 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+from flask import request, url_for, send_from_directory, abort
+
+#----------------------------------------------------------------------------#
+# Bundles.
+#----------------------------------------------------------------------------#
+
+# Files of each bundle, relative to the static folder, in load order. CSS
+# sources must sit one directory deep, like the bundles, so that their
+# relative url()s still resolve
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'main.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# Built bundles are written here, inside the static folder
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Precompressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+#----------------------------------------------------------------------------#
+# Building.
+#----------------------------------------------------------------------------#
+
+
+def minify_css(css):
+    """
+    Removes comments, except /*! license notices, and needless whitespace.
+    """
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    # Spaces before ':' are kept, as they separate descendant pseudo-classes
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """
+    Minifies JavaScript with rjsmin when it is installed. Without it the source
+    is left as it is, since regular expressions cannot safely parse JavaScript.
+    """
+    try:
+        import rjsmin
+    except ImportError:
+        return js
+    return rjsmin.jsmin(js)
+
+
+def bundle(static_folder, name, sources):
+    """
+    Returns the concatenated and minified contents of a bundle. Sources that
+    are already minified are included as they are.
+    """
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as file:
+            content = file.read()
+        if '.min.' not in source:
+            content = minify_css(content) if name.endswith('.css') else minify_js(content)
+        parts.append(content)
+    # Guard against sources that do not end their last statement
+    return ('\n' if name.endswith('.css') else ';\n').join(parts).encode('utf-8')
+
+
+def compress(content):
+    """
+    Returns the content compressed with each encoding available. Brotli needs
+    the optional brotli package.
+    """
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        return variants
+    variants['.br'] = brotli.compress(content, quality=11)
+    return variants
+
+
+def build_assets(static_folder):
+    """
+    Writes every bundle to static/dist under a name containing the hash of its
+    contents, with its precompressed variants, then records the names in the
+    manifest. Files of the previous build are kept, for pages still using
+    them, and older ones are removed. Returns the bundle sizes.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest_path = os.path.join(dist, MANIFEST)
+    previous = load_manifest(static_folder)
+
+    manifest = {}
+    sizes = {}
+    for name, sources in BUNDLES.items():
+        content = bundle(static_folder, name, sources)
+        stem, extension = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+        files = {filename: content}
+        for suffix, compressed in compress(content).items():
+            files[filename + suffix] = compressed
+        for path, data in files.items():
+            with open(os.path.join(dist, path), 'wb') as file:
+                file.write(data)
+        manifest[name] = filename
+        sizes[name] = {path[len(filename):] or 'raw': len(data) for path, data in files.items()}
+
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    keep = set(manifest.values()) | set(previous.values())
+    for path in os.listdir(dist):
+        base = path[:-3] if path.endswith(('.gz', '.br')) else path
+        if path != MANIFEST and base not in keep:
+            os.remove(os.path.join(dist, path))
+    return sizes
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+#----------------------------------------------------------------------------#
+# Assets Extension.
+#----------------------------------------------------------------------------#
+
+
+class Assets:
+    """
+    Provides the asset_urls() template helper and serves built bundles.
+
+    Once `flask assets` has built the bundles, asset_urls('main.css') returns
+    the URL of the content-hashed bundle, which is served with its gzip or
+    brotli variant and cached by browsers for a year. In debug mode, or before
+    a build, it returns the URLs of the source files instead.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.manifest = {} if app.debug else load_manifest(app.static_folder)
+        app.extensions['assets'] = self
+        app.jinja_env.globals['asset_urls'] = self.asset_urls
+        app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>',
+            'dist', self.serve)
+
+    def asset_urls(self, name):
+        if name in self.manifest:
+            return [url_for('dist', filename=self.manifest[name])]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def serve(self, filename):
+        if filename == MANIFEST:
+            abort(404)
+        directory = os.path.join(self.app.static_folder, DIST_DIR)
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in ENCODINGS:
+            if encoding in request.accept_encodings and os.path.isfile(
+                    os.path.join(directory, filename + suffix)):
+                response = send_from_directory(directory, filename + suffix,
+                    mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(directory, filename, mimetype=mimetype)
+
+        response.vary.add('Accept-Encoding')
+        # The name changes whenever the content does, so it never needs
+        # revalidating
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
@@ -0,0 +1,93 @@
+"""
+Bytes and latency tradeoff of response compression on the listing pages.
+
+Requests each listing page, at the largest page size, through the compression
+middleware at several gzip levels and brotli qualities, and reports the bytes
+sent, the median time to produce the compressed response and the estimated
+time to deliver it over a link of the given bandwidth. Brotli rows need the
+brotli package.
+
+The database must already hold data, for example from `flask seed`:
+
+    BENCH_DATABASE_URL=postgresql://localhost/fyyur_bench \\
+        python benchmarks/bench_compression.py --mbps 10
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'BENCH_DATABASE_URL' not in os.environ:
+    sys.exit('Set BENCH_DATABASE_URL to a seeded database.')
+os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+os.environ.setdefault('DEBUG', 'False')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+# Measure the rendering and compression, not the database
+os.environ['CACHE_TYPE'] = 'memory'
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from app import app
+import compression
+from compression import CompressionMiddleware
+
+PAGES = ['/venues', '/artists', '/shows']
+
+# (label, Accept-Encoding, middleware options)
+SETTINGS = [
+    ('identity', 'identity', {}),
+    ('gzip 1', 'gzip', {'level': 1}),
+    ('gzip 6', 'gzip', {'level': 6}),
+    ('gzip 9', 'gzip', {'level': 9}),
+]
+if compression.brotli is not None:
+    SETTINGS += [
+        ('br 1', 'br', {'brotli_quality': 1}),
+        ('br 4', 'br', {'brotli_quality': 4}),
+        ('br 11', 'br', {'brotli_quality': 11}),
+    ]
+
+
+def measure(client, url, accept_encoding, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers={'Accept-Encoding': accept_encoding})
+        body = response.get_data()
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned {response.status_code}')
+    return len(body), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--mbps', type=float, default=10,
+        help='Link bandwidth used to estimate the transfer time.')
+    args = parser.parse_args()
+
+    # The app's own middleware is bypassed so that each setting is measured
+    # on its own
+    inner = app.wsgi_app.app if isinstance(app.wsgi_app, CompressionMiddleware) else app.wsgi_app
+    limit = app.config['MAX_PAGE_SIZE']
+
+    for page in PAGES:
+        url = f'{page}?limit={limit}'
+        print(f'\n{url}')
+        print(f"  {'setting':<10} {'bytes':>10} {'ratio':>7} {'server ms':>10} {'total ms':>10}")
+        identity_size = None
+        for label, accept_encoding, options in SETTINGS:
+            client = Client(CompressionMiddleware(inner, min_size=0, **options), Response)
+            size, server_ms = measure(client, url, accept_encoding, args.repeat)
+            identity_size = identity_size or size
+            transfer_ms = size * 8 / (args.mbps * 1000)
+            print(f'  {label:<10} {size:>10} {identity_size / size:>7.1f} '
+                f'{server_ms:>10.2f} {server_ms + transfer_ms:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
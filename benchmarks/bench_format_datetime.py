@@ -0,0 +1,64 @@
+"""
+Micro-benchmark for the `datetime` template filter.
+
+Compares the previous filter, which re-parsed a strftime string with dateutil
+and formatted it through babel.dates.format_datetime, against the memoized
+filter fed with datetime objects. Run from the project root:
+
+    python benchmarks/bench_format_datetime.py
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DEBUG', 'False')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import babel.dates
+import dateutil.parser
+from app import format_datetime, cached_format_datetime
+
+SHOWS = 2000
+REPEAT = 5
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format="EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format="EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    # A shows page: shows spread over a few hundred distinct start times
+    start = datetime(2026, 1, 1, 20, 0)
+    times = [start + timedelta(days=i % 300) for i in range(SHOWS)]
+    strings = [t.strftime('%m/%d/%Y, %H:%M:%S') for t in times]
+
+    assert [legacy_format_datetime(s, 'full') for s in strings] == \
+        [format_datetime(t, 'full') for t in times]
+
+    def legacy():
+        for value in strings:
+            legacy_format_datetime(value, 'full')
+
+    def memoized():
+        cached_format_datetime.cache_clear()
+        for value in times:
+            format_datetime(value, 'full')
+
+    legacy_time = min(timeit.repeat(legacy, number=1, repeat=REPEAT))
+    memoized_time = min(timeit.repeat(memoized, number=1, repeat=REPEAT))
+    print(f'{SHOWS} show cards, best of {REPEAT}')
+    print(f'  parse + format:  {legacy_time * 1000:8.2f} ms')
+    print(f'  memoized filter: {memoized_time * 1000:8.2f} ms')
+    print(f'  speedup:         {legacy_time / memoized_time:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
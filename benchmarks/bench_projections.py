@@ -0,0 +1,101 @@
+"""
+Memory benchmark of ORM entities against column-only read projections.
+
+Loads every artist, 100k by default, in four ways: full ORM entities
+(`Artist.query.all()`), entities converted to dictionaries (what the listing
+views used to build), column-only rows, and the ArtistListing named tuples the
+listings use now. Reports the time taken and the peak memory traced while
+loading and while holding the results.
+
+The benchmark DROPS AND RECREATES every table, so it refuses to run unless the
+database is given explicitly through BENCH_DATABASE_URL:
+
+    BENCH_DATABASE_URL=postgresql://localhost/fyyur_bench \\
+        python benchmarks/bench_projections.py --rows 100000
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'BENCH_DATABASE_URL' not in os.environ:
+    sys.exit('Set BENCH_DATABASE_URL to a database the benchmark may wipe.')
+if not os.environ['BENCH_DATABASE_URL'].startswith('postgres'):
+    # The genres columns are PostgreSQL arrays, which create_all() cannot
+    # render for other databases
+    sys.exit('BENCH_DATABASE_URL must be a PostgreSQL database.')
+os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+os.environ.setdefault('DEBUG', 'False')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from app import app
+from models import db, Artist
+from queries import ArtistListing
+from fixtures import seed_catalogue
+
+
+def entities():
+    return Artist.query.all()
+
+
+def entity_dicts():
+    return [{'id': artist.id, 'name': artist.name} for artist in Artist.query.all()]
+
+
+def rows():
+    return db.session.query(Artist.id, Artist.name).all()
+
+
+def projections():
+    return [ArtistListing(*row) for row in db.session.query(Artist.id, Artist.name)]
+
+
+LOADERS = [
+    ('ORM entities', entities),
+    ('entities to dicts', entity_dicts),
+    ('column rows', rows),
+    ('named tuples', projections),
+]
+
+
+def measure(loader):
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = loader()
+    elapsed = time.perf_counter() - started
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(result)
+    del result
+    db.session.remove()
+    return count, elapsed * 1000, held / 2 ** 20, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.drop_all()
+        # The trigram name indexes need the operator classes pg_trgm provides
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        db.create_all()
+        method = 'copy' if db.engine.dialect.name == 'postgresql' else 'insert'
+        seed_catalogue(0, args.rows, 0, method=method)
+
+        print(f"  {'loader':<20} {'rows':>8} {'ms':>10} {'held MiB':>10} {'peak MiB':>10}")
+        for label, loader in LOADERS:
+            count, elapsed, held, peak = measure(loader)
+            print(f'  {label:<20} {count:>8} {elapsed:>10.1f} {held:>10.1f} {peak:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
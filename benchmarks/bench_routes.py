@@ -0,0 +1,121 @@
+"""
+Load-test benchmark for the app's read routes.
+
+For each catalogue size the benchmark recreates the schema, seeds it with
+`seed_catalogue` and then drives every read route through the Flask test
+client, reporting latency percentiles and the number of SQL queries issued per
+request. Sizes are numbers of shows; a tenth as many venues and artists are
+generated alongside them.
+
+The benchmark DROPS AND RECREATES every table, so it refuses to run unless the
+database is given explicitly through BENCH_DATABASE_URL:
+
+    BENCH_DATABASE_URL=postgresql://localhost/fyyur_bench \\
+        python benchmarks/bench_routes.py --sizes 1000 100000 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'BENCH_DATABASE_URL' not in os.environ:
+    sys.exit('Set BENCH_DATABASE_URL to a database the benchmark may wipe.')
+os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+os.environ.setdefault('DEBUG', 'False')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+# Measure the database work, not the view cache
+os.environ['CACHE_TYPE'] = 'none'
+
+from app import app
+from models import db, Show
+from fixtures import seed_catalogue
+from profiling import count_queries
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+# (method, url or url template, form data)
+ROUTES = [
+    ('GET', '/', None),
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('GET', '/venues/{venue_id}', None),
+    ('GET', '/artists/{artist_id}', None),
+    ('POST', '/venues/search', {'search_term': 'Hall'}),
+    ('POST', '/artists/search', {'search_term': 'Parker'}),
+    ('GET', '/venues/create', None),
+    ('GET', '/artists/create', None),
+    ('GET', '/shows/create', None),
+    ('GET', '/venues/{venue_id}/edit', None),
+    ('GET', '/artists/{artist_id}/edit', None),
+    ('GET', '/api/v1/venues', None),
+    ('GET', '/api/v1/artists', None),
+    ('GET', '/api/v1/shows', None),
+    ('GET', '/api/v1/venues/{venue_id}', None),
+    ('GET', '/api/v1/artists/{artist_id}', None),
+]
+
+
+def reset(size):
+    with app.app_context():
+        db.drop_all()
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        db.create_all()
+        method = 'copy' if db.engine.dialect.name == 'postgresql' else 'insert'
+        started = time.perf_counter()
+        seed_catalogue(max(size // 10, 1), max(size // 10, 1), size, method=method)
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                connection.exec_driver_sql('VACUUM ANALYZE')
+        elapsed = time.perf_counter() - started
+
+        # Detail pages are measured on the busiest venue and artist
+        busiest = {}
+        for key, column in (('venue_id', Show.venue_id), ('artist_id', Show.artist_id)):
+            busiest[key] = db.session.query(column).group_by(column).order_by(
+                db.func.count().desc()).limit(1).scalar()
+    return busiest, elapsed
+
+
+def measure(client, method, url, data, repeat):
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        with count_queries() as stats:
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            response.get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(stats.count)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {url} returned {response.status_code}')
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return statistics.median(timings), p95, max(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    client = app.test_client()
+
+    for size in args.sizes:
+        ids, seed_time = reset(size)
+        print(f'\n{size} shows (seeded in {seed_time:.1f}s)')
+        print(f"  {'route':<32} {'median ms':>10} {'p95 ms':>10} {'queries':>8}")
+        for method, url, data in ROUTES:
+            url = url.format(**ids)
+            median, p95, queries = measure(client, method, url, data, args.repeat)
+            print(f'  {method + " " + url:<32} {median:>10.2f} {p95:>10.2f} {queries:>8}')
+
+
+if __name__ == '__main__':
+    main()
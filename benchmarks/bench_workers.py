@@ -0,0 +1,128 @@
+"""
+Throughput benchmark of the gunicorn worker classes.
+
+Starts gunicorn with gunicorn.conf.py once per worker mode (sync, gthread and
+gevent), drives the read routes with concurrent keep-alive clients for a fixed
+time and reports requests per second and latency percentiles. The view cache
+is disabled so that every request does its database work.
+
+The database must already hold data, for example from `flask seed`:
+
+    BENCH_DATABASE_URL=postgresql://localhost/fyyur_bench \\
+        python benchmarks/bench_workers.py --workers 2 --concurrency 32
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = ['/', '/venues', '/artists', '/shows', '/api/v1/venues', '/api/v1/shows']
+
+# Worker class and extra environment of each mode
+MODES = {
+    'sync': ('sync', {}),
+    'gthread': ('gthread', {'THREADS': '8'}),
+    'gevent': ('gevent', {'WORKER_CONNECTIONS': '100'}),
+}
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'gunicorn did not start listening on port {port}')
+
+
+def client(port, duration, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    deadline = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < deadline:
+        route = ROUTES[i % len(ROUTES)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', route)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(route)
+        except (OSError, http.client.HTTPException):
+            errors.append(route)
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def run_mode(mode, args):
+    worker_class, extra = MODES[mode]
+    env = dict(os.environ, DATABASE_URL=os.environ['BENCH_DATABASE_URL'],
+        WORKER_CLASS=worker_class, WEB_CONCURRENCY=str(args.workers), CACHE_TYPE='none',
+        **extra)
+    env.setdefault('DEBUG', 'False')
+    env.setdefault('SECRET_KEY', 'benchmark')
+    server = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{args.port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.port)
+        # Warm up connections and caches before measuring
+        client(args.port, 1, [], [])
+
+        latencies = []
+        errors = []
+        threads = [threading.Thread(target=client,
+            args=(args.port, args.duration, latencies, errors))
+            for _ in range(args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    if not latencies:
+        return 0, 0, 0, len(errors)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return len(latencies) / elapsed, percentile(0.5), percentile(0.95), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    if 'BENCH_DATABASE_URL' not in os.environ:
+        sys.exit('Set BENCH_DATABASE_URL to a seeded database.')
+
+    print(f'{args.workers} workers, {args.concurrency} concurrent clients, {args.duration:g}s per mode')
+    print(f"  {'mode':<10} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'errors':>8}")
+    for mode in args.modes:
+        throughput, p50, p95, errors = run_mode(mode, args)
+        print(f'  {mode:<10} {throughput:>10.1f} {p50:>10.2f} {p95:>10.2f} {errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import time
+import pickle
+import threading
+from collections import Counter, OrderedDict
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+
+class MemoryBackend:
+    """
+    In-process LRU store whose entries expire after a time to live. Each worker
+    process keeps its own store, so entries written by other workers are only
+    dropped when they expire.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        # Counters live outside the LRU so that eviction can never roll a
+        # namespace back to a generation with stale entries
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    """
+    Store shared by every worker, backed by any client exposing the redis-py
+    get/set/incr methods.
+    """
+
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+
+class Cache:
+    """
+    Caches view data under namespaces such as 'venues' or 'venue:1'. Every
+    namespace has a generation counter that is part of its keys, so bumping the
+    counter invalidates all of the namespace's entries at once.
+    """
+
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        self.ttl = None
+        # Hits and misses per kind of namespace ('venue' for 'venue:1')
+        self.stats = Counter()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['cache'] = self
+        self.ttl = app.config.get('CACHE_TTL', 60)
+        if self.backend is not None:
+            return
+        cache_type = app.config.get('CACHE_TYPE', 'memory')
+        if cache_type == 'redis':
+            import redis
+            client = redis.Redis.from_url(app.config['CACHE_REDIS_URL'])
+            self.backend = RedisBackend(client)
+        elif cache_type == 'memory':
+            self.backend = MemoryBackend(app.config.get('CACHE_MAXSIZE', 1024))
+
+    def fetch(self, namespace, key, loader):
+        """
+        Returns the cached value for the key, calling the loader and caching its
+        result on a miss. None results are not cached.
+        """
+        if self.backend is None:
+            return loader()
+        generation = self.backend.counter(f'gen:{namespace}')
+        full_key = f'{namespace}:{generation}:{key}'
+
+        value = self.backend.get(full_key)
+        kind = namespace.split(':', 1)[0]
+        self.stats[kind, 'hit' if value is not None else 'miss'] += 1
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.backend.set(full_key, value, self.ttl)
+        return value
+
+    def invalidate(self, *namespaces):
+        if self.backend is None:
+            return
+        for namespace in set(namespaces):
+            self.backend.incr(f'gen:{namespace}')
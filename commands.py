@@ -0,0 +1,234 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import json
+import click
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db, Venue, Artist, Show
+from queries import venue_shows_query, artist_shows_query, recount_upcoming_shows
+from importer import IMPORTS, read_rows, import_rows
+from exporter import EXPORTS, FORMATS, export_chunks
+from fixtures import seed_catalogue
+from assets import build_assets
+
+#----------------------------------------------------------------------------#
+# Query Plans.
+#----------------------------------------------------------------------------#
+
+
+def explain(query):
+    """
+    Returns the database's query plan for a SQLAlchemy query as text.
+    """
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    if connection.dialect.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)
+    else:
+        rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), params)
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def detail_page_plans():
+    """
+    Returns the plans of the show queries run by the venue and artist detail
+    pages, each paired with the index it is expected to use.
+    """
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar() or 1
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar() or 1
+
+    checks = {
+        'show_venue': ('ix_shows_venue_id_start_time', venue_shows_query(venue_id)),
+        'show_artist': ('ix_shows_artist_id_start_time', artist_shows_query(artist_id)),
+    }
+    return {name: (index, explain(query)) for name, (index, query) in checks.items()}
+
+#----------------------------------------------------------------------------#
+# Pool Layout.
+#----------------------------------------------------------------------------#
+
+
+def pool_layout(config):
+    """
+    Describes the connections the app may open: per worker process, and in
+    total across the gunicorn workers.
+    """
+    options = config['SQLALCHEMY_ENGINE_OPTIONS']
+    if 'pool_size' not in options:
+        return 'Database pool: driver defaults'
+    per_worker = options['pool_size'] + options['max_overflow']
+    workers = config['WEB_CONCURRENCY']
+    return (f"Database pool: {config['WORKER_CLASS']} workers, {options['pool_size']} pooled "
+        f"+ {options['max_overflow']} overflow connections per worker, up to "
+        f"{per_worker * workers} across {workers} workers; recycle "
+        f"{options['pool_recycle']}s, pre-ping {'on' if options['pool_pre_ping'] else 'off'}, "
+        f"request statement timeout {config['DB_STATEMENT_TIMEOUT']}ms")
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes_command():
+    """Verify that the detail page queries are planned with their indexes."""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        # Small tables are cheaper to scan, so force the planner to show
+        # whether the index is usable at all
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+
+    failed = False
+    for name, (index, plan) in detail_page_plans().items():
+        used = index in plan
+        failed = failed or not used
+        click.echo(f"{name}: {'uses' if used else 'DOES NOT use'} {index}")
+        click.echo('  ' + plan.replace('\n', '\n  '))
+    db.session.rollback()
+
+    if failed:
+        raise SystemExit(1)
+
+
+@click.command('check-pool')
+@with_appcontext
+def check_pool_command():
+    """Report the connection pool layout and check it against the server."""
+    click.echo(pool_layout(current_app.config))
+    options = current_app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    if db.engine.dialect.name != 'postgresql' or 'pool_size' not in options:
+        return
+
+    with db.engine.connect() as connection:
+        max_connections = int(connection.exec_driver_sql('SHOW max_connections').scalar())
+        reserved = int(connection.exec_driver_sql(
+            'SHOW superuser_reserved_connections').scalar())
+        timeout = connection.exec_driver_sql('SHOW statement_timeout').scalar()
+    needed = (options['pool_size'] + options['max_overflow']) * current_app.config['WEB_CONCURRENCY']
+    available = max_connections - reserved
+    click.echo(f'Server: max_connections {max_connections} ({available} available), '
+        f'statement_timeout {timeout}')
+    if needed > available:
+        click.echo(f'The workers may open {needed} connections, more than the '
+            f'{available} the server allows', err=True)
+        raise SystemExit(1)
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(list(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']),
+    help='File format, guessed from the extension by default.')
+@click.option('--batch-size', default=1000, show_default=True,
+    help='Rows validated, loaded and committed together.')
+@click.option('--method', type=click.Choice(['auto', 'insert', 'copy']), default='auto',
+    show_default=True, help='Load with COPY (PostgreSQL only) or executemany INSERTs.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False),
+    help='Where rejected rows are reported. Defaults to PATH.errors.ndjson.')
+@with_appcontext
+def import_command(kind, path, file_format, batch_size, method, errors_path):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file."""
+    if file_format is None:
+        file_format = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+    if method == 'auto':
+        method = 'copy' if db.engine.dialect.name == 'postgresql' else 'insert'
+    errors_path = errors_path or f'{path}.errors.ndjson'
+
+    total_loaded = total_rejected = 0
+    with open(path, newline='', encoding='utf-8') as file, \
+            open(errors_path, 'w', encoding='utf-8') as errors_file:
+        rows = read_rows(file, file_format)
+        for loaded, rejected in import_rows(kind, rows, batch_size, method):
+            total_loaded += loaded
+            total_rejected += len(rejected)
+            for row, errors in rejected:
+                errors_file.write(json.dumps({'row': row, 'errors': errors}, default=str) + '\n')
+            click.echo(f'{kind}: {total_loaded} loaded, {total_rejected} rejected')
+
+    if total_rejected:
+        click.echo(f'Rejected rows written to {errors_path}')
+    else:
+        os.remove(errors_path)
+    # The pages pick up the import through their ETags, which key their cached
+    # data in every worker
+
+
+@click.command('export')
+@click.argument('tables', nargs=-1, type=click.Choice(list(EXPORTS)))
+@click.option('--format', 'file_format', type=click.Choice(list(FORMATS)), default='csv',
+    show_default=True)
+@click.option('--output-dir', type=click.Path(file_okay=False), default='.', show_default=True)
+@with_appcontext
+def export_command(tables, file_format, output_dir):
+    """Stream venues, artists and shows (all by default) to files."""
+    os.makedirs(output_dir, exist_ok=True)
+    for table in tables or EXPORTS:
+        path = os.path.join(output_dir, f'{table}.{file_format}')
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            for chunk in export_chunks(table, file_format):
+                file.write(chunk)
+        click.echo(f'{table}: written to {path}')
+
+
+@click.command('seed')
+@click.option('--venues', default=100, show_default=True)
+@click.option('--artists', default=100, show_default=True)
+@click.option('--shows', default=1000, show_default=True)
+@click.option('--seed', 'seed', default=0, show_default=True,
+    help='Random seed; with the same --anchor, an empty database gets the same rows.')
+@click.option('--anchor', type=click.DateTime(formats=['%Y-%m-%d']),
+    help='Date (YYYY-MM-DD) the show times are spread around. Defaults to today.')
+@click.option('--batch-size', default=10000, show_default=True)
+@with_appcontext
+def seed_command(venues, artists, shows, seed, anchor, batch_size):
+    """Generate realistic venues, artists and shows with bulk inserts."""
+    method = 'copy' if db.engine.dialect.name == 'postgresql' else 'insert'
+    try:
+        seed_catalogue(venues, artists, shows, seed, batch_size, method,
+            anchor and anchor.date())
+    except ValueError as error:
+        raise click.UsageError(str(error))
+    click.echo(f'Seeded {venues} venues, {artists} artists and {shows} shows')
+
+
+@click.command('assets')
+@with_appcontext
+def assets_command():
+    """Build the fingerprinted, precompressed CSS and JS bundles."""
+    for name, sizes in build_assets(current_app.static_folder).items():
+        click.echo(f'{name}: ' + ', '.join(
+            f'{size / 1024:.1f} KiB {variant}' for variant, size in sizes.items()))
+    click.echo('Restart the app to serve the new bundles')
+
+
+@click.command('roll-show-counts')
+@click.option('--window', default=1440, show_default=True,
+    help='Minutes back to look for shows that have started; keep it longer than the schedule interval.')
+@click.option('--all', 'everything', is_flag=True,
+    help='Recount every venue and artist instead.')
+@with_appcontext
+def roll_show_counts_command(window, everything):
+    """Settle the upcoming show counters of shows that have started."""
+    now = datetime.now()
+    started = None
+    if not everything:
+        started = db.session.query(Show).filter(
+            Show.start_time > now - timedelta(minutes=window), Show.start_time <= now)
+    venues = recount_upcoming_shows(Venue, Show.venue_id,
+        None if everything else started.with_entities(Show.venue_id).distinct())
+    artists = recount_upcoming_shows(Artist, Show.artist_id,
+        None if everything else started.with_entities(Show.artist_id).distinct())
+    db.session.commit()
+    # Rewritten rows get a new updated_at, which changes the listing's ETag and
+    # so its cache keys in every worker
+    click.echo(f'Updated {venues} venues and {artists} artists')
@@ -0,0 +1,195 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import zlib
+from werkzeug.http import parse_accept_header, parse_options_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Compressors.
+#----------------------------------------------------------------------------#
+
+COMPRESSIBLE_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson',
+    'image/svg+xml',
+)
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits 31 writes the gzip header and trailer around the deflate stream
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+#----------------------------------------------------------------------------#
+# Middleware.
+#----------------------------------------------------------------------------#
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with brotli or gzip, whichever the client
+    prefers among those available. Only compressible content types are
+    compressed, and only when they are at least min_size bytes long or
+    streamed without a length.
+
+    Bodies are compressed chunk by chunk as the app yields them. Streamed
+    responses are flushed after every chunk, so that clients still receive
+    each part as soon as it is produced.
+    """
+
+    def __init__(self, app, level=6, brotli_quality=4, min_size=500,
+            mimetypes=COMPRESSIBLE_MIMETYPES):
+        self.app = app
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.min_size = min_size
+        self.mimetypes = set(mimetypes)
+
+    def negotiate(self, environ):
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        available = ['br', 'gzip'] if brotli is not None else ['gzip']
+        # Prefer the client's choice, then brotli for its smaller output
+        return accepted.best_match(available)
+
+    def compressor(self, encoding):
+        if encoding == 'br':
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.level)
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ)
+        state = {}
+
+        def compressing_start_response(status, headers, exc_info=None):
+            state['started'] = True
+            code = int(status.split(' ', 1)[0])
+            mimetype, _ = parse_options_header(dict(
+                (name.lower(), value) for name, value in headers).get('content-type', ''))
+            if mimetype in self.mimetypes:
+                headers = add_vary(headers)
+
+            if (encoding and environ['REQUEST_METHOD'] != 'HEAD'
+                    and code not in (204, 206, 304) and code >= 200
+                    and self.compressible_headers(headers)):
+                state['streamed'] = not any(
+                    name.lower() == 'content-length' for name, _ in headers)
+                headers = [(name, value) for name, value in headers
+                    if name.lower() != 'content-length']
+                headers.append(('Content-Encoding', encoding))
+                headers = weaken_etag(headers)
+                state['compressor'] = self.compressor(encoding)
+            elif code == 304:
+                # 304s carry no Content-Type; match the Vary and weak ETag the
+                # compressed page was sent with
+                headers = add_vary(headers)
+                if encoding:
+                    headers = weaken_etag(headers)
+            return start_response(status, headers, exc_info)
+
+        body = self.app(environ, compressing_start_response)
+        if encoding is None or ('started' in state and 'compressor' not in state):
+            # Passed through untouched, keeping file wrappers for sendfile
+            return body
+        # The app may call start_response only once iteration begins, so the
+        # decision to compress is looked up when the first chunk arrives
+        return self.compress(body, state)
+
+    def compressible_headers(self, headers):
+        values = {}
+        for name, value in headers:
+            values[name.lower()] = value
+        mimetype, _ = parse_options_header(values.get('content-type', ''))
+        if mimetype not in self.mimetypes:
+            return False
+        if 'content-encoding' in values or 'no-transform' in values.get('cache-control', ''):
+            return False
+        length = values.get('content-length')
+        return length is None or int(length) >= self.min_size
+
+    def compress(self, body, state):
+        try:
+            compressor = None
+            for chunk in body:
+                if compressor is None:
+                    compressor = state.get('compressor')
+                    if compressor is None:
+                        yield chunk
+                        continue
+                data = compressor.compress(chunk)
+                if state['streamed']:
+                    data += compressor.flush()
+                if data:
+                    yield data
+            if compressor is None:
+                compressor = state.get('compressor')
+            if compressor is not None:
+                yield compressor.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+
+def add_vary(headers):
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == 'vary':
+            if 'accept-encoding' not in value.lower():
+                headers[i] = (name, value + ', Accept-Encoding')
+            return headers
+    return headers + [('Vary', 'Accept-Encoding')]
+
+
+def weaken_etag(headers):
+    # A compressed body is not byte-for-byte the one the strong ETag names
+    return [(name, 'W/' + value if name.lower() == 'etag' and not value.startswith('W/')
+        else value) for name, value in headers]
+
+#----------------------------------------------------------------------------#
+# Compression Extension.
+#----------------------------------------------------------------------------#
+
+
+class Compression:
+    """
+    Wraps the app's WSGI callable in CompressionMiddleware, configured with
+    COMPRESS_LEVEL, COMPRESS_BROTLI_QUALITY and COMPRESS_MIN_SIZE.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['compression'] = self
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app,
+            level=app.config.get('COMPRESS_LEVEL', 6),
+            brotli_quality=app.config.get('COMPRESS_BROTLI_QUALITY', 4),
+            min_size=app.config.get('COMPRESS_MIN_SIZE', 500))
@@ -1,13 +1,19 @@
 import os
-from decouple import config
+from decouple import config, undefined, Csv
 
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
 
-DEBUG = config('DEBUG')
+DEBUG = config('DEBUG', cast=bool)
+
+# Sessions and CSRF tokens are signed with SECRET_KEY, so every worker and node
+# must share the same key; it is required outside debug mode. To rotate it, move
+# the old key to SECRET_KEY_FALLBACKS (comma separated), which are still
+# accepted, and drop it from there once old sessions have expired
+SECRET_KEY = config('SECRET_KEY', default=os.urandom(32).hex() if DEBUG else undefined)
+SECRET_KEY_FALLBACKS = config('SECRET_KEY_FALLBACKS', default='', cast=Csv())
 
 # TODO IMPLEMENT DATABASE URL
 SQLALCHEMY_DATABASE_URI = config('DATABASE_URL')
@@ -18,5 +24,93 @@ if SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
 
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Gunicorn worker layout, also read by gunicorn.conf.py. Every worker process
+# has its own connection pool, sized for the requests it serves at once
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=2, cast=int)
+WORKER_CLASS = config('WORKER_CLASS', default='sync')
+THREADS = config('THREADS', default=1, cast=int)
+WORKER_CONNECTIONS = config('WORKER_CONNECTIONS', default=100, cast=int)
+
+# Concurrent requests per worker for each worker class, and so the default
+# number of pooled connections
+if WORKER_CLASS == 'gthread':
+    worker_concurrency = THREADS
+elif WORKER_CLASS in ('gevent', 'eventlet'):
+    # Green workers hold a connection only while a query runs
+    worker_concurrency = min(WORKER_CONNECTIONS, 10)
+else:
+    worker_concurrency = 1
+
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=worker_concurrency, cast=int)
+DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=max(worker_concurrency // 2, 1), cast=int)
+# Seconds to wait for a free connection before failing the request
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=int)
+# Connections older than this many seconds are replaced, before proxies or
+# failovers drop them
+DB_POOL_RECYCLE = config('DB_POOL_RECYCLE', default=1800, cast=int)
+# Test connections on checkout, so that stale ones are replaced transparently
+DB_POOL_PRE_PING = config('DB_POOL_PRE_PING', default=True, cast=bool)
+# Server-side limit on any single statement run for a web request, in
+# milliseconds (0 disables it). Set per transaction by app.py, so that
+# migrations and flask commands are not cut off
+DB_STATEMENT_TIMEOUT = config('DB_STATEMENT_TIMEOUT', default=30000, cast=int)
+DB_APPLICATION_NAME = config('DB_APPLICATION_NAME', default='fyyur')
+
+SQLALCHEMY_ENGINE_OPTIONS = {}
+if SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+        'connect_args': {
+            'application_name': DB_APPLICATION_NAME,
+        },
+    }
+
 # Keep CSRF token till end of current session
 WTF_CSRF_TIME_LIMIT = None
+# CSRF tokens signed with an old key stay valid during a rotation
+WTF_CSRF_SECRET_KEY = SECRET_KEY_FALLBACKS + [SECRET_KEY]
+
+# Number of rows shown per page on the venue, artist and show listings
+PAGE_SIZE = config('PAGE_SIZE', default=50, cast=int)
+MAX_PAGE_SIZE = config('MAX_PAGE_SIZE', default=200, cast=int)
+
+# Maximum number of results returned by a venue or artist search
+SEARCH_LIMIT = config('SEARCH_LIMIT', default=50, cast=int)
+
+# View data cache: 'memory' (per worker process), 'redis' or 'none'
+CACHE_TYPE = config('CACHE_TYPE', default='memory')
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='redis://localhost:6379/0')
+CACHE_TTL = config('CACHE_TTL', default=60, cast=int)
+CACHE_MAXSIZE = config('CACHE_MAXSIZE', default=1024, cast=int)
+
+# Request profiling: requests slower than SLOW_REQUEST_MS or running more than
+# MAX_REQUEST_QUERIES queries are logged with their statement fingerprints, as
+# are queries slower than SLOW_QUERY_MS
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=500, cast=int)
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=100, cast=int)
+MAX_REQUEST_QUERIES = config('MAX_REQUEST_QUERIES', default=25, cast=int)
+
+# Metrics served at /metrics. Under several worker processes, METRICS_DIR is a
+# directory shared by the workers so that /metrics reports them all;
+# gunicorn.conf.py sets one by default
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=int)
+
+# Log file of the non-debug app, written as JSON lines. The '{worker}' in the
+# name gives every gunicorn worker slot its own file, as processes rotating one
+# shared file lose records
+LOG_FILE = config('LOG_FILE', default='error.{worker}.log')
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=10485760, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=5, cast=int)
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+
+# Response compression. Bodies smaller than COMPRESS_MIN_SIZE bytes are sent as
+# they are; brotli is used when the brotli package is installed
+COMPRESS_LEVEL = config('COMPRESS_LEVEL', default=6, cast=int)
+COMPRESS_BROTLI_QUALITY = config('COMPRESS_BROTLI_QUALITY', default=4, cast=int)
+COMPRESS_MIN_SIZE = config('COMPRESS_MIN_SIZE', default=500, cast=int)
@@ -0,0 +1,100 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import io
+import csv
+import json
+from datetime import datetime
+from models import db, Venue, Artist, Show
+from api import VENUE_FIELDS, ARTIST_FIELDS, SHOW_FIELDS
+from importer import IMPORTS
+
+# Rows fetched per round trip from the server-side cursor, and written per chunk
+EXPORT_BATCH_SIZE = 5000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# The format of the forms' DateTimeField, which the importer validates with
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def import_names(table, fields):
+    """
+    Renames exported columns after the form fields the importer reads them
+    from, such as website to website_link.
+    """
+    form_fields = {column: field for field, column in IMPORTS[table][2].items()}
+    return [form_fields.get(name, name) for name in fields]
+
+
+# Exported tables and their columns
+EXPORTS = {
+    'venues': import_names('venues', VENUE_FIELDS),
+    'artists': import_names('artists', ARTIST_FIELDS),
+    'shows': import_names('shows', SHOW_FIELDS),
+}
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+
+def export_query(table):
+    """
+    Returns the query streaming a whole table in id order from a server-side
+    cursor. Shows are denormalized against their venue and artist names.
+    """
+    if table == 'venues':
+        query = db.session.query(*VENUE_FIELDS.values()).order_by(Venue.id)
+    elif table == 'artists':
+        query = db.session.query(*ARTIST_FIELDS.values()).order_by(Artist.id)
+    else:
+        query = db.session.query(*[column.label(field) for field, column in SHOW_FIELDS.items()]
+            ).select_from(Show
+            ).join(Venue, Show.venue_id == Venue.id
+            ).join(Artist, Show.artist_id == Artist.id
+            ).order_by(Show.id)
+    return query.execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+
+
+def flat_value(value):
+    """
+    Flattens a value in the form the importer reads back: datetimes in the
+    forms' format, booleans in lowercase and genres comma separated.
+    """
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, list):
+        return ','.join(value)
+    return value
+
+
+def export_chunks(table, format='csv'):
+    """
+    Yields a table as CSV or NDJSON text in chunks of EXPORT_BATCH_SIZE rows,
+    so the export never holds more than one chunk in memory.
+    """
+    fields = EXPORTS[table]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == 'csv':
+        writer.writerow(fields)
+
+    for count, row in enumerate(export_query(table), start=1):
+        if format == 'csv':
+            writer.writerow([flat_value(value) for value in row])
+        else:
+            buffer.write(json.dumps(dict(zip(fields, row)), default=flat_value) + '\n')
+
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
@@ -0,0 +1,157 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import random
+from datetime import datetime, timedelta
+from forms import VenueForm
+from models import db, Venue, Artist, Show
+from importer import copy_rows, insert_rows
+from queries import recount_upcoming_shows
+
+#----------------------------------------------------------------------------#
+# Vocabulary.
+#----------------------------------------------------------------------------#
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Chicago', 'IL'), ('Austin', 'TX'), ('Houston', 'TX'),
+    ('Nashville', 'TN'), ('Memphis', 'TN'), ('New Orleans', 'LA'),
+    ('Seattle', 'WA'), ('Portland', 'OR'), ('Denver', 'CO'), ('Atlanta', 'GA'),
+    ('Detroit', 'MI'), ('Boston', 'MA'), ('Philadelphia', 'PA'), ('Miami', 'FL'),
+    ('Minneapolis', 'MN'), ('Las Vegas', 'NV'),
+]
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+
+ADJECTIVES = [
+    'Blue', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Crimson', 'Silver',
+    'Wild', 'Rusty', 'Neon', 'Hollow', 'Lucky', 'Quiet', 'Broken', 'Painted',
+]
+NOUNS = [
+    'Room', 'Tavern', 'Lounge', 'Hall', 'Cellar', 'Garden', 'Warehouse',
+    'Theatre', 'Club', 'Barn', 'Loft', 'Stage', 'Den', 'Parlor', 'Dome',
+]
+FIRST_NAMES = [
+    'Guns', 'Matt', 'The Wild', 'Sam', 'Nina', 'Otis', 'Lena', 'Ray',
+    'Ella', 'Miles', 'Joni', 'Marvin', 'Patti', 'Stevie', 'Aretha',
+]
+LAST_NAMES = [
+    'N Petals', 'Quevedo', 'Sax Band', 'Rivers', 'Stone', 'Holloway',
+    'Parker', 'Reed', 'Fontaine', 'Cole', 'Hart', 'Banks', 'Shaw', 'Vega',
+]
+STREETS = ['Valencia St', 'Main St', 'Broadway', 'Market St', 'Elm St', 'Oak Ave']
+
+#----------------------------------------------------------------------------#
+# Generators.
+#----------------------------------------------------------------------------#
+
+
+def phone(rng):
+    return f'{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}'
+
+
+def slug(name):
+    return ''.join(c for c in name.lower() if c.isalnum())
+
+
+def venue_row(rng, i, now):
+    city, state = rng.choice(CITIES)
+    name = f'The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}'
+    seeking_talent = rng.random() < 0.3
+    return {
+        'name': name,
+        'city': city,
+        'state': state,
+        'address': f'{rng.randint(1, 2000)} {rng.choice(STREETS)}',
+        'phone': phone(rng),
+        'website': f'https://www.{slug(name)}.com',
+        'image_link': f'https://images.example.com/venues/{i}.jpg',
+        'facebook_link': f'https://www.facebook.com/{slug(name)}',
+        'genres': rng.sample(GENRES, rng.randint(1, 3)),
+        'seeking_talent': seeking_talent,
+        'seeking_description': 'Looking for local acts.' if seeking_talent else '',
+        'updated_at': now,
+    }
+
+
+def artist_row(rng, i, now):
+    city, state = rng.choice(CITIES)
+    name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}'
+    seeking_venue = rng.random() < 0.3
+    return {
+        'name': name,
+        'city': city,
+        'state': state,
+        'phone': phone(rng),
+        'website': f'https://www.{slug(name)}.com',
+        'image_link': f'https://images.example.com/artists/{i}.jpg',
+        'facebook_link': f'https://www.facebook.com/{slug(name)}',
+        'genres': rng.sample(GENRES, rng.randint(1, 3)),
+        'seeking_venue': seeking_venue,
+        'seeking_description': 'Looking for shows this season.' if seeking_venue else '',
+        'updated_at': now,
+    }
+
+
+def show_row(rng, venue_ids, artist_ids, anchor):
+    # Shows spread over a year either side of the anchor, on the hour
+    return {
+        'venue_id': rng.choice(venue_ids),
+        'artist_id': rng.choice(artist_ids),
+        'start_time': anchor + timedelta(hours=rng.randint(-365 * 24, 365 * 24)),
+    }
+
+#----------------------------------------------------------------------------#
+# Seeding.
+#----------------------------------------------------------------------------#
+
+
+def load_batches(table, rows, count, batch_size, load):
+    batch = []
+    for i in range(count):
+        batch.append(rows(i))
+        if len(batch) == batch_size:
+            load(table, batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        load(table, batch)
+        db.session.commit()
+
+
+def seed_catalogue(venues, artists, shows, seed=0, batch_size=10000, method='insert',
+        anchor=None):
+    """
+    Inserts generated venues, artists and shows in batches. Show times are
+    spread around the anchor date, today unless given, so that both upcoming
+    and past shows exist.
+
+    Seeding an empty database with the same seed and anchor always produces the
+    same rows. Names are numbered on from the rows already there and shows pick
+    from all existing venues and artists, so seeding a non-empty database adds
+    different rows.
+    """
+    rng = random.Random(seed)
+    load = copy_rows if method == 'copy' else insert_rows
+    now = datetime.utcnow()
+    anchor = datetime.combine(anchor or datetime.now().date(), datetime.min.time())
+
+    offset = db.session.query(db.func.count(Venue.id)).scalar()
+    load_batches(Venue.__table__, lambda i: venue_row(rng, offset + i, now),
+        venues, batch_size, load)
+    offset = db.session.query(db.func.count(Artist.id)).scalar()
+    load_batches(Artist.__table__, lambda i: artist_row(rng, offset + i, now),
+        artists, batch_size, load)
+
+    if shows:
+        venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+        artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+        if not venue_ids or not artist_ids:
+            raise ValueError('Shows need at least one venue and one artist')
+        load_batches(Show.__table__, lambda i: show_row(rng, venue_ids, artist_ids, anchor),
+            shows, batch_size, load)
+        # Bulk loads bypass the show write paths, so the counters are set once
+        recount_upcoming_shows(Venue, Show.venue_id)
+        recount_upcoming_shows(Artist, Show.artist_id)
+        db.session.commit()
@@ -0,0 +1,100 @@
+"""
+Gunicorn settings. The worker layout comes from the environment:
+
+    WEB_CONCURRENCY     number of worker processes (2)
+    WORKER_CLASS        sync, gthread or gevent (sync)
+    THREADS             threads per gthread worker (1)
+    WORKER_CONNECTIONS  concurrent requests per gevent worker (100)
+
+The same variables size the database connection pool in config.py.
+METRICS_DIR defaults to a directory under the system temporary directory, so
+that /metrics adds up the counters of every worker.
+"""
+import os
+import glob
+import tempfile
+import decouple
+
+worker_class = decouple.config('WORKER_CLASS', default='sync')
+
+if worker_class == 'gevent':
+    # Patch before preload_app imports the app, so that sockets, locks and the
+    # database driver it creates are all cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+
+    def gevent_wait_callback(connection, timeout=None):
+        # Yields to other greenlets while psycopg2 waits on the server
+        while True:
+            state = connection.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(connection.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(connection.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
+
+    extensions.set_wait_callback(gevent_wait_callback)
+
+# Set before config.py reads it, so that the workers share their metrics
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-metrics'))
+
+from config import WEB_CONCURRENCY, THREADS, WORKER_CONNECTIONS, METRICS_DIR
+
+workers = WEB_CONCURRENCY
+threads = THREADS
+worker_connections = WORKER_CONNECTIONS
+
+# Import the app once in the master, so that workers start quickly and share
+# its memory until they write to it
+preload_app = True
+
+# Recycle workers now and then to bound memory growth, staggered so they do
+# not all restart at once
+max_requests = decouple.config('MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = max_requests // 10
+
+# A sync worker cannot report in to the master while it serves a request, so
+# its timeout also caps every response, including streamed exports of whole
+# tables. Serve those from gthread or gevent workers, which keep reporting in
+# while they stream, or write them with `flask export`
+timeout = decouple.config('WORKER_TIMEOUT', default=30, cast=int)
+graceful_timeout = timeout
+keepalive = 5
+
+
+def on_starting(server):
+    # Counters of workers from a previous run would be added to this run's
+    if METRICS_DIR:
+        for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+            os.remove(path)
+
+
+def pre_fork(server, worker):
+    # Database connections opened in the master must not be inherited by the
+    # workers, where several processes would share one socket
+    from app import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose()
+
+    # Take the lowest slot no live worker holds, so that a recycled worker's
+    # replacement writes to the same log file instead of starting a new one
+    taken = {getattr(other, 'slot', None) for other in server.WORKERS.values()}
+    worker.slot = min(slot for slot in range(len(taken) + 1) if slot not in taken)
+    app.extensions['logging'].worker = f'worker-{worker.slot}'
+
+
+def worker_exit(server, worker):
+    # Write the final counters of a recycled or stopped worker, which would
+    # otherwise be lost with their last flush interval
+    from app import app
+    metrics = app.extensions['metrics']
+    if metrics.directory:
+        metrics.flush()
@@ -0,0 +1,233 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import io
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from werkzeug.datastructures import MultiDict
+from wtforms.validators import DataRequired
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show
+from queries import recount_upcoming_shows
+
+#----------------------------------------------------------------------------#
+# Row Specs.
+#----------------------------------------------------------------------------#
+
+# For each importable table: the form validating a row and the mapping from
+# form fields to table columns
+IMPORTS = {
+    'venues': (Venue, VenueForm, {
+        'name': 'name',
+        'city': 'city',
+        'state': 'state',
+        'address': 'address',
+        'phone': 'phone',
+        'website_link': 'website',
+        'image_link': 'image_link',
+        'facebook_link': 'facebook_link',
+        'genres': 'genres',
+        'seeking_talent': 'seeking_talent',
+        'seeking_description': 'seeking_description',
+    }),
+    'artists': (Artist, ArtistForm, {
+        'name': 'name',
+        'city': 'city',
+        'state': 'state',
+        'phone': 'phone',
+        'genres': 'genres',
+        'website_link': 'website',
+        'image_link': 'image_link',
+        'facebook_link': 'facebook_link',
+        'seeking_venue': 'seeking_venue',
+        'seeking_description': 'seeking_description',
+    }),
+    'shows': (Show, ShowForm, {
+        'artist_id': 'artist_id',
+        'venue_id': 'venue_id',
+        'start_time': 'start_time',
+    }),
+}
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+
+def read_rows(file, format):
+    """
+    Yields the rows of a CSV or NDJSON file as dictionaries, one at a time.
+    """
+    if format == 'csv':
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Checkbox fields, and the spellings of false that leave them unchecked
+BOOLEAN_FIELDS = {'seeking_talent', 'seeking_venue'}
+FALSE_VALUES = {'', 'false', 'f', '0', 'no', 'n', 'off'}
+
+
+def to_formdata(row):
+    """
+    Converts a raw row into form data, as a browser would have posted it.
+    Genres may be a list or a comma separated string. Checkboxes are left out,
+    as browsers do, when false or spelled as false.
+    """
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None or value is False:
+            continue
+        if key in BOOLEAN_FIELDS and str(value).strip().lower() in FALSE_VALUES:
+            continue
+        if value is True:
+            value = 'y'
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(',') if genre.strip()]
+        if isinstance(value, list):
+            for item in value:
+                formdata.add(key, str(item))
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def validate_row(form_class, fields, row):
+    """
+    Validates a row with the same form used by the create views. Returns the
+    column values and None, or None and the validation errors.
+
+    Required fields must be given by the row itself: form defaults, such as
+    ShowForm's start_time, would otherwise fill them in unnoticed.
+    """
+    form = form_class(formdata=to_formdata(row), meta={'csrf': False})
+    errors = {} if form.validate() else dict(form.errors)
+    for field in form:
+        if not field.raw_data and any(
+                isinstance(validator, DataRequired) for validator in field.validators):
+            errors[field.name] = ['This field is required.']
+    if errors:
+        return None, errors
+    return {column: form[field].data for field, column in fields.items()}, None
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+
+def copy_value(value):
+    if isinstance(value, list):
+        items = (str(item).replace('\\', '\\\\').replace('"', '\\"') for item in value)
+        return '{' + ','.join(f'"{item}"' for item in items) + '}'
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return value
+
+
+def copy_rows(table, rows):
+    """
+    Loads rows with PostgreSQL's COPY FROM STDIN, the fastest bulk path.
+    """
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    # Strings are quoted so that empty strings stay distinct from unquoted NULLs
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def insert_rows(table, rows):
+    """
+    Loads rows with one executemany INSERT.
+    """
+    db.session.execute(table.insert(), rows)
+
+
+def existing_ids(model, ids):
+    return {id for id, in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def check_show_references(valid, rejected):
+    """
+    Moves shows whose venue or artist does not exist to the rejected rows, so
+    that a single bad row cannot fail its whole batch on a foreign key error.
+    """
+    checked = []
+    for row, values in valid:
+        try:
+            values['venue_id'] = int(values['venue_id'])
+            values['artist_id'] = int(values['artist_id'])
+        except ValueError:
+            rejected.append((row, {'venue_id': ['Ids must be numbers']}))
+            continue
+        checked.append((row, values))
+
+    venue_ids = existing_ids(Venue, {values['venue_id'] for _, values in checked})
+    artist_ids = existing_ids(Artist, {values['artist_id'] for _, values in checked})
+    valid = []
+    for row, values in checked:
+        if values['venue_id'] not in venue_ids:
+            rejected.append((row, {'venue_id': ['Unknown venue']}))
+        elif values['artist_id'] not in artist_ids:
+            rejected.append((row, {'artist_id': ['Unknown artist']}))
+        else:
+            valid.append((row, values))
+    return valid
+
+
+def import_rows(kind, rows, batch_size=1000, method='insert'):
+    """
+    Validates and loads rows into the venues, artists or shows table, committing
+    one batch at a time. Yields the number of loaded rows and the rejected rows,
+    each with its errors, after every batch.
+    """
+    model, form_class, fields = IMPORTS[kind]
+    load = copy_rows if method == 'copy' else insert_rows
+    rows = iter(rows)
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+
+        valid = []
+        rejected = []
+        for row in batch:
+            values, errors = validate_row(form_class, fields, row)
+            if errors:
+                rejected.append((row, errors))
+            else:
+                valid.append((row, values))
+
+        if kind == 'shows':
+            valid = check_show_references(valid, rejected)
+
+        loaded = [values for _, values in valid]
+        now = datetime.utcnow()
+        if kind == 'shows':
+            # New shows change their venues' and artists' pages
+            for parent, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+                parent.query.filter(parent.id.in_({row[key] for row in loaded})
+                    ).update({'updated_at': now}, synchronize_session=False)
+        else:
+            for row in loaded:
+                row['updated_at'] = now
+        if loaded:
+            load(model.__table__, loaded)
+        if kind == 'shows':
+            recount_upcoming_shows(Venue, Show.venue_id, {row['venue_id'] for row in loaded})
+            recount_upcoming_shows(Artist, Show.artist_id, {row['artist_id'] for row in loaded})
+        db.session.commit()
+
+        yield len(loaded), rejected
@@ -0,0 +1,158 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import json
+import uuid
+import queue
+import atexit
+import logging
+import traceback
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+#----------------------------------------------------------------------------#
+# Records.
+#----------------------------------------------------------------------------#
+
+
+class RequestFilter(logging.Filter):
+    """
+    Stamps records with the id, method and path of the request being handled.
+    Runs on the request thread, before the record is queued.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'location': f'{record.pathname}:{record.lineno}',
+        }
+        for key in ('request_id', 'method', 'path'):
+            if getattr(record, key, None) is not None:
+                entry[key] = getattr(record, key)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queues records without ever blocking the caller. When the queue is full,
+    because the disk cannot keep up, records are dropped and counted.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback on the calling thread, while their
+        # arguments are still valid, and let the frames go
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+#----------------------------------------------------------------------------#
+# Queued Logging.
+#----------------------------------------------------------------------------#
+
+
+class QueuedLogging:
+    """
+    Routes the app's log records through a queue to a rotating JSON log file,
+    written by a listener thread, so that logging never waits on the disk.
+
+    Several processes rotating one file would overwrite each other's logs, so
+    '{worker}' in LOG_FILE, as in the default error.{worker}.log, is replaced
+    by the name of the process: 'worker-<slot>' in a gunicorn worker, where
+    gunicorn.conf.py hands a recycled worker's slot to its replacement, and
+    'main' anywhere else. The listener thread is restarted in forked worker
+    processes, as threads do not survive a fork.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.listener = None
+        self.worker = 'main'
+        self.queue_handler = DroppingQueueHandler(queue.Queue(app.config.get('LOG_QUEUE_SIZE', 10000)))
+        self.queue_handler.addFilter(RequestFilter())
+        app.extensions['logging'] = self
+
+        level = app.config.get('LOG_LEVEL', 'INFO')
+        app.logger.setLevel(level)
+        self.queue_handler.setLevel(level)
+        # Flask's own stderr handler is moved behind the queue as well
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(self.queue_handler)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+        self.start()
+        os.register_at_fork(after_in_child=self.restart)
+        atexit.register(self.stop)
+
+    def file_handler(self):
+        config = self.app.config
+        path = config.get('LOG_FILE', 'error.{worker}.log').replace('{worker}', self.worker)
+        handler = RotatingFileHandler(path, maxBytes=config.get('LOG_MAX_BYTES', 10485760),
+            backupCount=config.get('LOG_BACKUP_COUNT', 5), delay=True)
+        handler.setFormatter(JsonFormatter())
+        return handler
+
+    def start(self):
+        self.listener = QueueListener(self.queue_handler.queue, self.file_handler(),
+            default_handler, respect_handler_level=True)
+        self.listener.start()
+
+    def restart(self):
+        # The parent's queue lock and listener thread are not usable in the
+        # child, so start over with fresh ones
+        self.queue_handler.queue = queue.Queue(self.queue_handler.queue.maxsize)
+        self.start()
+
+    def stop(self):
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+            self.listener.handlers[0].close()
+
+    def before_request(self):
+        # Ids passed in by a proxy are kept, so that its logs can be matched
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+
+    def after_request(self, response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
@@ -0,0 +1,343 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import json
+import time
+import glob
+import fcntl
+import bisect
+import threading
+from flask import Response, g, request
+from jinja2 import Template
+from models import db
+
+#----------------------------------------------------------------------------#
+# Registry.
+#----------------------------------------------------------------------------#
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRIPTIONS = {
+    'fyyur_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'fyyur_request_duration_seconds': ('histogram', 'Request latency by endpoint.'),
+    'fyyur_template_render_seconds': ('histogram', 'Template render time by template.'),
+    'fyyur_cache_requests_total': ('counter', 'View cache lookups by namespace and result.'),
+    'fyyur_db_pool_size': ('gauge', 'Connections the pools keep open.'),
+    'fyyur_db_pool_checked_out': ('gauge', 'Connections currently checked out.'),
+    'fyyur_db_pool_overflow': ('gauge', 'Connections open beyond the pool size.'),
+    'fyyur_workers': ('gauge', 'Worker processes reporting metrics.'),
+}
+
+
+# Totals of exited workers, inside METRICS_DIR
+EXITED_FILE = 'metrics-exited.json'
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """
+    Counters and histograms of one process. Updates only take a lock and add to
+    a dictionary entry, so recording costs microseconds per request.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One count per bucket plus +Inf, then the sum of observations
+                histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[bisect.bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value]
+                    for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)]
+                    for (name, labels), values in self.histograms.items()],
+            }
+
+#----------------------------------------------------------------------------#
+# Merging and Exposition.
+#----------------------------------------------------------------------------#
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(path, snapshot):
+    with open(path + '.tmp', 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(path + '.tmp', path)
+
+
+def merge(snapshots):
+    """
+    Adds up the snapshots of every worker. Counters and histograms of exited
+    workers still count towards the totals; their gauges are dropped.
+    """
+    counters = {}
+    histograms = {}
+    gauges = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+        if snapshot.get('live', True):
+            for name, value in snapshot['gauges'].items():
+                gauges[name] = gauges.get(name, 0) + value
+    gauges['fyyur_workers'] = sum(1 for snapshot in snapshots if snapshot.get('live', True))
+    return counters, histograms, gauges
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def exposition(counters, histograms, gauges, buckets=LATENCY_BUCKETS):
+    """
+    Renders merged metrics in the Prometheus text format.
+    """
+    lines = []
+    described = set()
+
+    def describe(name):
+        if name not in described:
+            described.add(name)
+            kind, help = DESCRIPTIONS.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name)
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    for (name, labels), values in sorted(histograms.items()):
+        describe(name)
+        cumulative = 0
+        for bound, count in zip(buckets + ('+Inf',), values[:-1]):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {values[-1]}')
+        lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    for name, value in sorted(gauges.items()):
+        describe(name)
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+#----------------------------------------------------------------------------#
+# Metrics Extension.
+#----------------------------------------------------------------------------#
+
+
+class Metrics:
+    """
+    Records request, template, cache and connection pool metrics and serves them
+    at /metrics.
+
+    With METRICS_DIR set, as gunicorn.conf.py does by default, every worker
+    process writes a snapshot of its metrics to its own file in that directory
+    every METRICS_FLUSH_INTERVAL seconds, from a background thread, and /metrics
+    adds up the files of all workers. The files of exited workers are folded
+    into one file of their totals, so recycled workers do not leave a growing
+    number of files to read. Without it, /metrics only reports the process that
+    serves the scrape.
+    """
+
+    def __init__(self, app=None):
+        self.registry = Registry()
+        self.pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config.get('METRICS_DIR') or None
+        self.interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+        app.extensions['metrics'] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+
+        metrics = self
+
+        class TimedTemplate(Template):
+            def render(self, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return super().render(*args, **kwargs)
+                finally:
+                    metrics.registry.observe('fyyur_template_render_seconds',
+                        {'template': self.name}, time.perf_counter() - started)
+
+            def generate(self, *args, **kwargs):
+                # Streamed pages are timed while they render, not while their
+                # chunks wait to be sent
+                elapsed = 0.0
+                started = time.perf_counter()
+                for chunk in super().generate(*args, **kwargs):
+                    elapsed += time.perf_counter() - started
+                    yield chunk
+                    started = time.perf_counter()
+                elapsed += time.perf_counter() - started
+                metrics.registry.observe('fyyur_template_render_seconds',
+                    {'template': self.name}, elapsed)
+
+        app.jinja_env.template_class = TimedTemplate
+
+    def start_worker(self):
+        # Runs once per process, so that workers forked from a preloaded app
+        # start from empty counters and run their own flush thread
+        self.pid = os.getpid()
+        self.registry = Registry()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            thread = threading.Thread(target=self.flush_forever, daemon=True)
+            thread.start()
+
+    def before_request(self):
+        if self.pid != os.getpid():
+            self.start_worker()
+        g.metrics_started = time.perf_counter()
+
+    def after_request(self, response):
+        if 'metrics_started' not in g:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        self.registry.inc('fyyur_requests_total', {'endpoint': endpoint,
+            'method': request.method, 'status': response.status_code})
+        self.registry.observe('fyyur_request_duration_seconds', {'endpoint': endpoint},
+            time.perf_counter() - g.metrics_started)
+        return response
+
+    def gauges(self):
+        gauges = {}
+        with self.app.app_context():
+            pool = db.engine.pool
+        for name, attribute in (('fyyur_db_pool_size', 'size'),
+                ('fyyur_db_pool_checked_out', 'checkedout'),
+                ('fyyur_db_pool_overflow', 'overflow')):
+            # Only QueuePool, PostgreSQL's default, exposes all three
+            if hasattr(pool, attribute):
+                gauges[name] = max(getattr(pool, attribute)(), 0)
+        return gauges
+
+    def snapshot(self):
+        snapshot = self.registry.snapshot()
+        cache = self.app.extensions.get('cache')
+        if cache is not None:
+            snapshot['counters'].extend(
+                ['fyyur_cache_requests_total', [['namespace', kind], ['result', result]], count]
+                for (kind, result), count in list(cache.stats.items()))
+        snapshot['gauges'] = self.gauges()
+        snapshot['pid'] = os.getpid()
+        return snapshot
+
+    def flush(self):
+        write_snapshot(os.path.join(self.directory, f'metrics-{os.getpid()}.json'),
+            self.snapshot())
+
+    def flush_forever(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Could not write metrics')
+
+    def fold_exited(self):
+        """
+        Adds the counters and histograms of exited workers to the totals in
+        EXITED_FILE and removes their files. Scrapes served by several workers
+        at once take turns, so no file is folded twice.
+        """
+        exited_path = os.path.join(self.directory, EXITED_FILE)
+        with open(os.path.join(self.directory, 'metrics.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            folded = []
+            snapshots = []
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                if path == exited_path:
+                    continue
+                snapshot = read_snapshot(path)
+                if snapshot is not None and not pid_alive(snapshot['pid']):
+                    folded.append(path)
+                    snapshots.append(snapshot)
+            if not folded:
+                return
+
+            previous = read_snapshot(exited_path)
+            if previous is not None:
+                snapshots.append(previous)
+            counters, histograms, _ = merge(snapshots)
+            write_snapshot(exited_path, {
+                'counters': [[name, labels, value]
+                    for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, values]
+                    for (name, labels), values in histograms.items()],
+                'gauges': {},
+                'pid': None,
+            })
+            for path in folded:
+                os.remove(path)
+
+    def collect(self):
+        own = self.snapshot()
+        snapshots = [own]
+        if self.directory:
+            self.fold_exited()
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                snapshot = read_snapshot(path)
+                if snapshot is None or snapshot['pid'] == own['pid']:
+                    continue
+                snapshot['live'] = snapshot['pid'] is not None and pid_alive(snapshot['pid'])
+                snapshots.append(snapshot)
+        return merge(snapshots)
+
+    def view(self):
+        return Response(exposition(*self.collect()),
+            mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,29 @@
+"""add show and venue indexes
+
+Revision ID: b7c41d9e2f63
+Revises: a38e3cf5719a
+Create Date: 2026-10-18 09:12:04.512318
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c41d9e2f63'
+down_revision = 'a38e3cf5719a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venues_city_state', 'venues', ['city', 'state'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_city_state', table_name='venues')
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,28 @@
+"""add name trigram indexes
+
+Revision ID: c52e8a10f4d7
+Revises: b7c41d9e2f63
+Create Date: 2026-10-18 10:03:27.190845
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e8a10f4d7'
+down_revision = 'b7c41d9e2f63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venues_name_trgm', 'venues', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artists_name_trgm', 'artists', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artists_name_trgm', table_name='artists')
+    op.drop_index('ix_venues_name_trgm', table_name='venues')
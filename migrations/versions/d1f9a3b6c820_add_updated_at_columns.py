@@ -0,0 +1,34 @@
+"""add updated_at columns
+
+Revision ID: d1f9a3b6c820
+Revises: c52e8a10f4d7
+Create Date: 2026-10-18 11:21:45.630027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1f9a3b6c820'
+down_revision = 'c52e8a10f4d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill existing rows with the current UTC time, then leave the value to
+    # the application like the models do
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+            server_default=sa.text("(now() at time zone 'utc')")))
+        op.alter_column(table, 'updated_at', server_default=None)
+    op.create_index('ix_venues_updated_at', 'venues', ['updated_at'], unique=False)
+    op.create_index('ix_artists_updated_at', 'artists', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artists_updated_at', table_name='artists')
+    op.drop_index('ix_venues_updated_at', table_name='venues')
+    op.drop_column('artists', 'updated_at')
+    op.drop_column('venues', 'updated_at')
@@ -0,0 +1,34 @@
+"""add upcoming_shows_count columns
+
+Revision ID: e4a7c2d9b351
+Revises: d1f9a3b6c820
+Create Date: 2026-10-18 16:02:11.418503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d9b351'
+down_revision = 'd1f9a3b6c820'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Show times are stored as local time, hence LOCALTIMESTAMP rather than now()
+    for table, foreign_key in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+            nullable=False, server_default='0'))
+        op.execute(f'''
+            UPDATE {table} SET upcoming_shows_count = (
+                SELECT count(*) FROM shows
+                WHERE shows.{foreign_key} = {table}.id
+                AND shows.start_time > LOCALTIMESTAMP)
+        ''')
+
+
+def downgrade():
+    op.drop_column('artists', 'upcoming_shows_count')
+    op.drop_column('venues', 'upcoming_shows_count')
@@ -0,0 +1,32 @@
+"""add deletions table
+
+Revision ID: f2b8d4e6a913
+Revises: e4a7c2d9b351
+Create Date: 2026-10-18 15:02:37.204815
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4e6a913'
+down_revision = 'e4a7c2d9b351'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    deletions = op.create_table('deletions',
+        sa.Column('table', sa.String(length=64), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('table')
+    )
+    # One row per table up front, so that deletions only ever update them
+    op.bulk_insert(deletions, [{'table': table, 'deleted_at': datetime.utcnow()}
+        for table in ('venues', 'artists', 'shows')])
+
+
+def downgrade():
+    op.drop_table('deletions')
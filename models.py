@@ -14,8 +14,15 @@ db = SQLAlchemy()
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        # Detail pages filter shows by venue or artist and split them on start_time
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        # The shows listing pages through shows in (start_time, id) order
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+    )
 
-    id = db.Column(db.Integer, db.Sequence('shows_id_seq'), primary_key=True)
+    id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', onupdate='CASCADE', ondelete='CASCADE'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', onupdate='CASCADE', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow())
@@ -30,6 +37,13 @@ class Show(db.Model):
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_city_state', 'city', 'state'),
+        db.Index('ix_venues_updated_at', 'updated_at'),
+        # Trigram index answering name searches, requires the pg_trgm extension
+        db.Index('ix_venues_name_trgm', 'name',
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -43,6 +57,9 @@ class Venue(db.Model):
     genres = db.Column(db.ARRAY(db.String()), nullable=False)
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
+    # Maintained by the show write paths and the roll-show-counts command
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self) -> str:
         return f'<Venue {self.id, self.name, self.address}>'
@@ -50,6 +67,11 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_updated_at', 'updated_at'),
+        db.Index('ix_artists_name_trgm', 'name',
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -62,12 +84,28 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String())
+    # Maintained by the show write paths and the roll-show-counts command
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
 
     def __repr__(self) -> str:
         return f'<Artist {self.id, self.name}>'
 
 
+class Deletion(db.Model):
+    # When rows were last deleted from each table. Deletions leave no
+    # updated_at behind, so the listing validators read this instead of
+    # counting the table's rows
+    __tablename__ = 'deletions'
+
+    table = db.Column(db.String(64), primary_key=True)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f'<Deletion {self.table, self.deleted_at}>'
+
+
 
 # Starting Data
 
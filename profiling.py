@@ -0,0 +1,162 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import re
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Statement Fingerprints.
+#----------------------------------------------------------------------------#
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMS = re.compile(r'%\(\w+\)s|(?<!:):\w+|\?|\$\d+')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """
+    Reduces a SQL statement to its shape by replacing literals and bind
+    parameters with '?' and collapsing IN lists, so that the repeated queries of
+    an N+1 pattern share one fingerprint.
+    """
+    statement = _STRING.sub('?', statement)
+    statement = _PARAMS.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _IN_LIST.sub('(...)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+#----------------------------------------------------------------------------#
+# Query Stats.
+#----------------------------------------------------------------------------#
+
+
+class QueryStats:
+    """
+    Number of queries, total database time and per-fingerprint counts collected
+    over a request or a `count_queries` block.
+    """
+
+    def __init__(self, slow_query_ms=None):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.slow_queries = []
+        self.slow_query_ms = slow_query_ms
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        shape = fingerprint(statement)
+        self.fingerprints[shape] += 1
+        if self.slow_query_ms is not None and duration * 1000 >= self.slow_query_ms:
+            self.slow_queries.append((duration, shape))
+
+
+_local = threading.local()
+
+
+def _active_blocks():
+    if not hasattr(_local, 'blocks'):
+        _local.blocks = []
+    return _local.blocks
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start_time'].pop()
+    if has_app_context() and 'query_stats' in g:
+        g.query_stats.record(statement, duration)
+    for stats in _active_blocks():
+        stats.record(statement, duration)
+
+
+@contextmanager
+def count_queries():
+    """
+    Collects the queries run on this thread inside the block:
+
+        with count_queries() as stats:
+            client.get('/venues')
+        assert stats.count <= 3
+    """
+    stats = QueryStats()
+    _active_blocks().append(stats)
+    try:
+        yield stats
+    finally:
+        _active_blocks().remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Fails with an AssertionError listing the query fingerprints when the block
+    runs more than `limit` queries.
+    """
+    with count_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        shapes = '\n'.join(f'  {n} x {shape}' for shape, n in stats.fingerprints.most_common())
+        raise AssertionError(f'{stats.count} queries run, at most {limit} expected:\n{shapes}')
+
+#----------------------------------------------------------------------------#
+# Request Profiler.
+#----------------------------------------------------------------------------#
+
+
+class QueryProfiler:
+    """
+    Counts the queries and database time of every request, reports them in a
+    Server-Timing header and logs requests that are slow or run too many
+    queries, with their statement fingerprints.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['query_profiler'] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self):
+        g.request_started = time.perf_counter()
+        g.query_stats = QueryStats(self.app.config.get('SLOW_QUERY_MS'))
+
+    def after_request(self, response):
+        if 'query_stats' not in g:
+            return response
+        stats = g.query_stats
+        total_ms = (time.perf_counter() - g.request_started) * 1000
+        db_ms = stats.duration * 1000
+
+        response.headers.add('Server-Timing',
+            f'db;dur={db_ms:.2f};desc="{stats.count} queries", total;dur={total_ms:.2f}')
+
+        config = self.app.config
+        too_slow = total_ms >= config.get('SLOW_REQUEST_MS', 500)
+        too_many = stats.count > config.get('MAX_REQUEST_QUERIES', 25)
+        if too_slow or too_many or stats.slow_queries:
+            shapes = '\n'.join(f'  {n} x {shape}' for shape, n in stats.fingerprints.most_common(10))
+            slow = '\n'.join(f'  {d * 1000:.1f} ms: {shape}' for d, shape in stats.slow_queries)
+            self.app.logger.warning(
+                f'{request.method} {request.full_path} took {total_ms:.1f} ms, '
+                f'{stats.count} queries in {db_ms:.1f} ms\n{shapes}'
+                + (f'\nSlow queries:\n{slow}' if slow else ''))
+        return response
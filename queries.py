@@ -0,0 +1,411 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+import base64
+import hashlib
+import binascii
+from collections import namedtuple
+from itertools import groupby
+from datetime import datetime, timezone
+from flask import current_app, request
+from models import db, Venue, Artist, Show, Deletion
+from search import search_by_name
+
+#----------------------------------------------------------------------------#
+# Keyset Pagination.
+#----------------------------------------------------------------------------#
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(values):
+    """
+    Encodes the sort key of a row into an opaque, url-safe cursor string.
+    """
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, columns):
+    """
+    Decodes a cursor back into sort key values matching the given columns.
+    Returns None when the cursor is missing or malformed, including when a
+    value does not have the type of its column.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        decoded = []
+        for v, c in zip(values, columns):
+            if isinstance(c.type, db.DateTime):
+                v = datetime.fromisoformat(v)
+            # bool is a subclass of int, but never a valid integer key
+            elif not isinstance(v, c.type.python_type) or isinstance(v, bool):
+                return None
+            decoded.append(v)
+        return tuple(decoded)
+    except (ValueError, TypeError, NotImplementedError, binascii.Error):
+        return None
+
+
+def get_page_args():
+    """
+    Returns the keyset cursors and page size requested through the query string.
+    The page size is clamped to the configured maximum.
+    """
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    return {
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+        'limit': limit,
+    }
+
+
+def keyset_page(query, columns, after=None, before=None, limit=50):
+    """
+    Returns one page of the query's rows ordered by the given key columns.
+    Pages are located with a range condition on the key rather than an OFFSET,
+    so each request only reads the rows it returns.
+    """
+    key = db.tuple_(*columns)
+    after = decode_cursor(after, columns)
+    before = decode_cursor(before, columns)
+
+    if before is not None:
+        query = query.filter(key < before).order_by(*[c.desc() for c in columns])
+    else:
+        if after is not None:
+            query = query.filter(key > after)
+        query = query.order_by(*columns)
+
+    # Fetch one extra row to learn whether another page follows
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+
+    if not rows:
+        return Page(rows, None, None)
+
+    first = encode_cursor([rows[0]._mapping[c] for c in columns])
+    last = encode_cursor([rows[-1]._mapping[c] for c in columns])
+    if before is not None:
+        return Page(rows, last, first if has_more else None)
+    return Page(rows, last if has_more else None, first if after is not None else None)
+
+#----------------------------------------------------------------------------#
+# Read Models.
+#----------------------------------------------------------------------------#
+
+# Listing and search rows are built as named tuples from column-only selects,
+# rather than as ORM objects or dictionaries: they hold only the columns a page
+# renders, are not tracked by the session and take a fraction of the memory
+
+Area = namedtuple('Area', ['city', 'state', 'venues'])
+VenueListing = namedtuple('VenueListing', ['id', 'name', 'num_upcoming_shows'])
+ArtistListing = namedtuple('ArtistListing', ['id', 'name'])
+ShowListing = namedtuple('ShowListing', ['venue_id', 'venue_name', 'artist_id',
+    'artist_name', 'artist_image_link', 'start_time'])
+SearchResult = namedtuple('SearchResult', ['id', 'name', 'num_upcoming_shows'])
+
+VENUE_DETAIL_COLUMNS = [
+    Venue.id, Venue.name, Venue.genres, Venue.address, Venue.city,
+    Venue.state, Venue.phone, Venue.website, Venue.facebook_link,
+    Venue.seeking_talent, Venue.seeking_description, Venue.image_link,
+]
+ARTIST_DETAIL_COLUMNS = [
+    Artist.id, Artist.name, Artist.genres, Artist.city, Artist.state,
+    Artist.phone, Artist.website, Artist.facebook_link, Artist.seeking_venue,
+    Artist.seeking_description, Artist.image_link,
+]
+
+#----------------------------------------------------------------------------#
+# Read Queries.
+#----------------------------------------------------------------------------#
+
+
+def venue_areas(after=None, before=None, limit=50):
+    """
+    Returns a page of venues grouped by city and state, each venue carrying its
+    number of upcoming shows. The counts are read from the maintained
+    upcoming_shows_count column, so no shows are aggregated.
+    """
+    query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state,
+        Venue.upcoming_shows_count.label('num_upcoming_shows'))
+    page = keyset_page(query, [Venue.city, Venue.state, Venue.id],
+        after=after, before=before, limit=limit)
+
+    # Rows arrive sorted by location, so each area can be built as it streams in
+    areas = []
+    for (city, state), venues in groupby(page.items, key=lambda row: (row.city, row.state)):
+        areas.append(Area(city, state, [
+            VenueListing(venue.id, venue.name, venue.num_upcoming_shows)
+            for venue in venues]))
+    return page._replace(items=areas)
+
+
+def artist_listings(after=None, before=None, limit=50):
+    """
+    Returns a page of artists, each with the artist's name and id.
+    """
+    query = db.session.query(Artist.id, Artist.name)
+    page = keyset_page(query, [Artist.id], after=after, before=before, limit=limit)
+    return page._replace(items=[ArtistListing(*artist) for artist in page.items])
+
+
+def show_listings(after=None, before=None, limit=50):
+    """
+    Returns a page of shows alongside the venue and artist details needed to
+    list them. Shows, venues and artists are fetched in one joined query,
+    selecting only the columns rendered on the shows page.
+    """
+    query = db.session.query(
+            Show.id, Show.venue_id, Venue.name.label('venue_name'),
+            Show.artist_id, Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            Show.start_time
+        ).join(Venue, Show.venue_id == Venue.id
+        ).join(Artist, Show.artist_id == Artist.id)
+    page = keyset_page(query, [Show.start_time, Show.id],
+        after=after, before=before, limit=limit)
+
+    shows = [ShowListing(show.venue_id, show.venue_name, show.artist_id,
+        show.artist_name, show.artist_image_link, show.start_time)
+        for show in page.items]
+    return page._replace(items=shows)
+
+
+def partition_shows(rows):
+    """
+    Splits show rows into upcoming and past shows in a single pass, comparing
+    every row against the same captured timestamp.
+    """
+    now = datetime.now()
+    upcoming_shows = []
+    past_shows = []
+    for row in rows:
+        show = dict(row._mapping)
+        if row.start_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return upcoming_shows, past_shows
+
+
+def venue_shows_query(venue_id):
+    """
+    Returns the query for a venue's shows joined to the artist columns the venue
+    page renders.
+    """
+    return db.session.query(
+            Show.start_time, Artist.id.label('artist_id'),
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')
+        ).join(Artist, Show.artist_id == Artist.id
+        ).filter(Show.venue_id == venue_id
+        ).order_by(Show.start_time)
+
+
+def artist_shows_query(artist_id):
+    """
+    Returns the query for an artist's shows joined to the venue columns the
+    artist page renders.
+    """
+    return db.session.query(
+            Show.start_time, Venue.id.label('venue_id'),
+            Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link')
+        ).join(Venue, Show.venue_id == Venue.id
+        ).filter(Show.artist_id == artist_id
+        ).order_by(Show.start_time)
+
+
+def venue_shows(venue_id):
+    """
+    Returns a venue's upcoming and past shows, fetched in one query.
+    """
+    return partition_shows(venue_shows_query(venue_id))
+
+
+def artist_shows(artist_id):
+    """
+    Returns an artist's upcoming and past shows, fetched in one query.
+    """
+    return partition_shows(artist_shows_query(artist_id))
+
+
+def venue_details(venue_id):
+    """
+    Returns a venue's details alongside its upcoming and past shows, or None if
+    the venue does not exist.
+    """
+    venue = db.session.query(*VENUE_DETAIL_COLUMNS).filter(Venue.id == venue_id).first()
+    if venue is None:
+        return None
+
+    upcoming_shows, past_shows = venue_shows(venue_id)
+
+    return {
+        **venue._mapping,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+
+def artist_details(artist_id):
+    """
+    Returns an artist's details alongside the shows they've registered for, or
+    None if the artist does not exist.
+    """
+    artist = db.session.query(*ARTIST_DETAIL_COLUMNS).filter(Artist.id == artist_id).first()
+    if artist is None:
+        return None
+
+    upcoming_shows, past_shows = artist_shows(artist_id)
+
+    return {
+        **artist._mapping,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+        }
+
+
+def search_results(model, term, limit=50):
+    """
+    Returns the venues or artists whose name matches the search term, each with
+    its number of upcoming shows, in a single query.
+    """
+    matches = search_by_name(
+        db.session.query(model.id, model.name, model.upcoming_shows_count),
+        model.name, term, limit=limit)
+
+    data = [SearchResult(*match) for match in matches]
+    return {
+        "count": len(data),
+        "data": data
+        }
+
+
+#----------------------------------------------------------------------------#
+# Counters.
+#----------------------------------------------------------------------------#
+
+
+def recount_upcoming_shows(model, foreign_key, ids=None):
+    """
+    Sets the upcoming_shows_count of the given venues or artists, or of all of
+    them when ids is None, to their current number of upcoming shows. Only rows
+    whose count changed are written, and so marked as updated. Returns the
+    number of rows written.
+
+    The rows are locked first, in a statement of their own. On PostgreSQL's
+    READ COMMITTED, a transaction adding a show for the same venue or artist
+    then commits before the count's snapshot is taken, so its show is counted;
+    counting under the UPDATE's row lock alone would use a snapshot taken
+    before that show was visible and skip the row.
+    """
+    rows = model.query.with_entities(model.id)
+    if ids is not None:
+        rows = rows.filter(model.id.in_(ids))
+    rows.order_by(model.id).with_for_update().all()
+
+    count = db.session.query(db.func.count(Show.id)
+        ).filter(foreign_key == model.id, Show.start_time > datetime.now()
+        ).scalar_subquery()
+    query = model.query.filter(model.upcoming_shows_count != count)
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+    return query.update({'upcoming_shows_count': count}, synchronize_session=False)
+
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+
+def validator(updated_at, last_show, *etag_parts):
+    """
+    Returns the Last-Modified date and ETag of a page from the latest update of
+    its rows and the start of its latest past show, the moment that show moved
+    from the upcoming to the past list. updated_at is stored in UTC while show
+    times are local.
+    """
+    times = []
+    if updated_at is not None:
+        times.append(updated_at.replace(tzinfo=timezone.utc))
+    if last_show is not None:
+        times.append(last_show.astimezone(timezone.utc))
+    last_modified = max(times, default=datetime.fromtimestamp(0, timezone.utc))
+
+    parts = [last_modified.isoformat(), *etag_parts]
+    etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return last_modified, etag
+
+
+def page_validator(model, foreign_key, id):
+    """
+    Returns the Last-Modified date and ETag of a venue or artist page, or None
+    if the row does not exist. Both come from one indexed lookup.
+    """
+    now = datetime.now()
+    last_show = db.session.query(db.func.max(Show.start_time)
+        ).filter(foreign_key == model.id, Show.start_time <= now
+        ).scalar_subquery()
+    row = db.session.query(model.updated_at, last_show).filter(model.id == id).first()
+    if row is None:
+        return None
+    return validator(row[0], row[1], id)
+
+
+def last_deletion(*models):
+    """
+    Returns when rows were last deleted from the tables of the given models, or
+    None if they never were, from a primary key lookup.
+    """
+    return db.session.query(db.func.max(Deletion.deleted_at)).filter(
+        Deletion.table.in_([model.__tablename__ for model in models])).scalar()
+
+
+def listing_validator(model, foreign_key=None):
+    """
+    Returns the Last-Modified date and ETag of the venue or artist listing, from
+    the latest update of its rows and the last deletion from its table; both are
+    index lookups, whatever the size of the table. Show times are only taken
+    into account when the listing displays upcoming show counts.
+    """
+    updated_at = db.session.query(db.func.max(model.updated_at)).scalar()
+    deleted_at = last_deletion(model)
+    last_show = None
+    if foreign_key is not None:
+        last_show = db.session.query(db.func.max(Show.start_time)
+            ).filter(Show.start_time <= datetime.now()).scalar()
+    return validator(max(filter(None, (updated_at, deleted_at)), default=None),
+        last_show, deleted_at)
+
+
+def show_listing_validator():
+    """
+    Returns the Last-Modified date and ETag of the show listing, from the latest
+    show, the latest update of the venues and artists it names and the last
+    deletion of shows. Each is an index lookup.
+    """
+    last_id, venue_updated_at, artist_updated_at = db.session.query(
+        db.session.query(db.func.max(Show.id)).scalar_subquery(),
+        db.session.query(db.func.max(Venue.updated_at)).scalar_subquery(),
+        db.session.query(db.func.max(Artist.updated_at)).scalar_subquery()).one()
+    deleted_at = last_deletion(Show)
+    updated_at = max(filter(None, (venue_updated_at, artist_updated_at, deleted_at)),
+        default=None)
+    return validator(updated_at, None, last_id, deleted_at)
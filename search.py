@@ -0,0 +1,63 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import re
+from models import db
+
+# pg_trgm's default similarity threshold for the % operator
+SIMILARITY_THRESHOLD = 0.3
+
+#----------------------------------------------------------------------------#
+# Trigram Similarity.
+#----------------------------------------------------------------------------#
+
+
+def trigrams(text):
+    """
+    Returns the set of trigrams of a string, following pg_trgm's rules: each
+    lowercased word is padded with two spaces in front and one behind.
+    """
+    grams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """
+    Returns how similar two strings are, from 0 to 1, as pg_trgm's similarity()
+    computes it: the share of trigrams the two strings have in common.
+    """
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+
+def search_by_name(query, column, term, limit=50):
+    """
+    Returns up to `limit` rows of the query whose column contains the search term
+    or is similar to it, best matches first. On PostgreSQL both conditions are
+    answered by the column's pg_trgm GIN index; other databases fall back to
+    ranking the rows in Python.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return query.filter(
+                db.or_(column.ilike(f'%{term}%'), column.op('%')(term))
+            ).order_by(db.func.similarity(column, term).desc(), column
+            ).limit(limit).all()
+
+    ranked = []
+    for row in query:
+        name = getattr(row, column.key)
+        score = similarity(name, term)
+        if term.lower() in name.lower() or score >= SIMILARITY_THRESHOLD:
+            ranked.append((score, name, row))
+    ranked.sort(key=lambda match: (-match[0], match[1]))
+    return [row for _, _, row in ranked[:limit]]
@@ -0,0 +1,47 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+#----------------------------------------------------------------------------#
+# Session Interface.
+#----------------------------------------------------------------------------#
+
+
+class RotatingKeySessionInterface(SecureCookieSessionInterface):
+    """
+    Signs session cookies with SECRET_KEY and also accepts cookies signed with
+    any key in SECRET_KEY_FALLBACKS, so that rotating the key does not log
+    everyone out.
+
+    Flask only sends a session cookie back when the session changes, so a
+    session accepted with a fallback key is marked as modified, and re-signed
+    with the new key on the response to the first request that uses it.
+    """
+
+    def keyed_serializer(self, app, keys):
+        signer_kwargs = dict(
+            key_derivation=self.key_derivation, digest_method=self.digest_method
+        )
+        # itsdangerous signs with the last key and verifies with all of them
+        return URLSafeTimedSerializer(keys, salt=self.salt,
+            serializer=self.serializer, signer_kwargs=signer_kwargs)
+
+    def get_signing_serializer(self, app):
+        if not app.secret_key:
+            return None
+        return self.keyed_serializer(app,
+            list(app.config.get('SECRET_KEY_FALLBACKS', [])) + [app.secret_key])
+
+    def open_session(self, app, request):
+        session = super().open_session(app, request)
+        # Only checked during a rotation, when there are fallback keys
+        if session and app.config.get('SECRET_KEY_FALLBACKS'):
+            try:
+                self.keyed_serializer(app, [app.secret_key]).loads(
+                    request.cookies[self.get_cookie_name(app)])
+            except BadSignature:
+                session.modified = True
+        return session